@@ -1,47 +1,145 @@
-import inspect
+import contextlib
+import mmap
+import os
+import pathlib
+from typing import TYPE_CHECKING
 
-import networkx as nx
-import spacy
 import spacy_transformers  # noqa: F401
+from caching import BlockPredictionCache
+from clean_preprints_pymupdf import pdf_bytes_to_struct, text_from_struct
+from core import analyze_pdf_text, get_affiliation_dict, set_prediction_cache
 from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from models import (
+    THRESHOLD,
+    load_ner_model,
+    load_prefilter_model,
+    load_textcat_model,
+)
 from pydantic import BaseModel, Field
-from utils import analyze_pdf_text, get_affiliation_dict
+from starlette.datastructures import Headers
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+# Affiliations are usually on the first pages of a preprint, but some papers
+# list them at the end, so every page is extracted unless MAX_PAGES is set
+MAX_PAGES = int(os.environ["MAX_PAGES"]) if os.environ.get("MAX_PAGES") else None
+
+# If set, only run NER on blocks that textcat gives at least this AFFILIATION or
+# AUTHOR score, or that are next to a predicted affiliation. This can drop
+# blocks that only NER would have flagged, so it's off until the cascade has
+# been checked on the dev set with evaluate_extraction.py --check-cascade
+NER_MAYBE_THRESHOLD = (
+    float(os.environ["NER_MAYBE_THRESHOLD"]) if os.environ.get("NER_MAYBE_THRESHOLD") else None
+)
+
+# Blocks that the pre-filter rules out get zero scores, which can change the
+# results, so it's only used if PREFILTER_MODEL is set rather than whenever
+# prefilter.py has been run
+USE_PREFILTER = bool(os.environ.get("PREFILTER_MODEL"))
+
+# Largest PDF we accept, in bytes
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 100 * 1024 * 1024))
+
+# Boilerplate blocks like license footers repeat across preprints, so keep
+# their predictions in memory, and in a SQLite file if PREDICTION_CACHE is set
+PREDICTION_CACHE_PATH = os.environ.get("PREDICTION_CACHE")
+set_prediction_cache(
+    BlockPredictionCache(
+        path=pathlib.Path(PREDICTION_CACHE_PATH) if PREDICTION_CACHE_PATH else None
+    )
+)
+
+
+# Helper to map an uploaded file into memory, yielding a buffer for PyMuPDF
+@contextlib.contextmanager
+def upload_buffer(file, max_size=None):
+    # Starlette has already spooled the upload to a temporary file, so map that
+    # file rather than copying it again or reading it all into memory
+    max_size = MAX_UPLOAD_SIZE if max_size is None else max_size
+    upload = file.file
+    size = upload.seek(0, os.SEEK_END)
+    upload.seek(0)
+    if size > max_size:
+        raise HTTPException(status_code=413, detail="File is too large")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+    upload.flush()
+    with mmap.mmap(upload.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = memoryview(mapped)
+        try:
+            yield buffer
+        finally:
+            buffer.release()
 
-from scripts.clean_preprints_pymupdf import pdf_bytes_to_struct, text_from_struct
 
-ner_model = None
-textcat_model = None
+# Helper to run the entire processing pipeline on an uploaded file
+async def analyze_pdf_file(
+    file,
+    textcat,
+    ner,
+    threshold=THRESHOLD,
+    max_pages=MAX_PAGES,
+    maybe_threshold=NER_MAYBE_THRESHOLD,
+    prefilter=None,
+) -> "nx.Graph":
+    with upload_buffer(file) as buffer:
+        pdf_struct = pdf_bytes_to_struct(buffer, max_pages=max_pages, flat=True)
+    pdf_text = text_from_struct(pdf_struct)
+    return analyze_pdf_text(
+        pdf_text, textcat, ner, threshold, maybe_threshold, prefilter=prefilter
+    )
 
 
-# memoized helpers for loading models so we don't have to reload them on every request
-def load_ner_model():
-    global ner_model
-    if ner_model is None:
-        ner_model = spacy.load("en_core_web_trf")
-    return ner_model
+## API schema
 
+app = FastAPI()
 
-def load_textcat_model():
-    global textcat_model
-    if textcat_model is None:
-        textcat_model = spacy.load("training/textcat/model-best")
-    return textcat_model
 
+class UploadSizeLimit:
+    """Reject request bodies larger than we accept, before or while reading them."""
 
-# Helper to run the entire processing pipeline on an uploaded file
-async def analyze_pdf_file(file, textcat, ner, threshold=0.75) -> nx.Graph:
-    if inspect.iscoroutinefunction(file.read):
-        pdf_bytes = await file.read()
-    else:
-        pdf_bytes = file.read()
-    pdf_struct = pdf_bytes_to_struct(pdf_bytes)
-    pdf_text = text_from_struct(pdf_struct)
-    return analyze_pdf_text(pdf_text, textcat, ner, threshold)
+    def __init__(self, app, max_size: int):
+        self.app = app
+        self.max_size = max_size
 
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
 
-## API schema
+        # Bodies that declare their size can be rejected before any of it is read
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length:
+            try:
+                declared_size = int(content_length)
+            except ValueError:
+                response = JSONResponse(
+                    status_code=400, content={"detail": "Invalid Content-Length"}
+                )
+                return await response(scope, receive, send)
+            if declared_size > self.max_size:
+                response = JSONResponse(status_code=413, content={"detail": "File is too large"})
+                return await response(scope, receive, send)
 
-app = FastAPI()
+        # Chunked uploads don't, so count their bytes as they arrive and stop
+        # once there are too many, rather than letting Starlette spool them all
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail="File is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# Allow some room for the multipart form encoding around the file itself
+app.add_middleware(UploadSizeLimit, max_size=MAX_UPLOAD_SIZE + 64 * 1024)
 
 
 class Organization(BaseModel):
@@ -80,7 +178,8 @@ async def analyze(file: UploadFile) -> Document:
     ner = load_ner_model()
 
     # Analyze the document
-    graph = await analyze_pdf_file(file, textcat, ner)
+    prefilter = load_prefilter_model() if USE_PREFILTER else None
+    graph = await analyze_pdf_file(file, textcat, ner, prefilter=prefilter)
 
     # Format all of the authors & affiliations
     people = []
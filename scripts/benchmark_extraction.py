@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+import json
+import multiprocessing
+import pathlib
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import typer
+from rich import print
+from rich.table import Table
+
+BACKENDS = ["pymupdf", "docling"]
+
+
+def peak_rss_mb() -> float:
+    """Get the peak resident memory of the current process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Get the q-th percentile of a list of values (nearest rank)."""
+    if not values:
+        return 0.0
+    ranked = sorted(values)
+    return ranked[min(len(ranked) - 1, max(0, round(q / 100 * len(ranked)) - 1))]
+
+
+def run_pymupdf(pdf_paths: list[pathlib.Path], max_pages: int | None) -> dict:
+    """Extract text from each PDF with PyMuPDF, timing each document."""
+    from clean_preprints_pymupdf import pdf_path_to_struct, text_from_struct
+
+    results = {}
+    for pdf_path in pdf_paths:
+        start = time.perf_counter()
+        try:
+            pdf_struct = pdf_path_to_struct(pdf_path, max_pages=max_pages, flat=True)
+            text = text_from_struct(pdf_struct)
+        except Exception as e:
+            results[pdf_path.stem] = {"error": str(e)}
+            continue
+        results[pdf_path.stem] = {
+            "seconds": time.perf_counter() - start,
+            "pages": len(pdf_struct),
+            "text": text,
+        }
+    return results
+
+
+def run_docling(pdf_paths: list[pathlib.Path], fast: bool) -> dict:
+    """Extract text from each PDF with spaCyLayout, timing each document."""
+    import spacy
+    from clean_preprints import doc_to_text, docling_options
+    from spacy_layout import spaCyLayout
+
+    layout = spaCyLayout(spacy.blank("en"), docling_options=docling_options(fast))
+    results = {}
+    for pdf_path in pdf_paths:
+        start = time.perf_counter()
+        try:
+            doc = layout(str(pdf_path))
+            text = doc_to_text(doc)
+        except Exception as e:
+            results[pdf_path.stem] = {"error": str(e)}
+            continue
+        results[pdf_path.stem] = {
+            "seconds": time.perf_counter() - start,
+            "pages": len(doc._.pages),
+            "text": text,
+        }
+    return results
+
+
+def run_backend(
+    backend: str,
+    pdf_paths: list[pathlib.Path],
+    fast: bool,
+    max_pages: int | None,
+) -> tuple[dict, float, float]:
+    """Run one backend, returning per-document results, setup time and peak memory."""
+    # Runs in a fresh process so that peak memory is attributable to the backend
+    start = time.perf_counter()
+    if backend == "pymupdf":
+        results = run_pymupdf(pdf_paths, max_pages)
+    elif backend == "docling":
+        results = run_docling(pdf_paths, fast)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+    total_seconds = time.perf_counter() - start
+    return results, total_seconds, peak_rss_mb()
+
+
+def summarize(results: dict, total_seconds: float, peak_rss: float, golds: dict) -> dict:
+    """Compute throughput, latency, memory and quality for a backend run."""
+    from evaluate_extraction import score_prediction
+
+    done = {pid: result for pid, result in results.items() if "error" not in result}
+    latencies = [result["seconds"] for result in done.values()]
+    extract_seconds = sum(latencies)
+    pages = sum(result["pages"] for result in done.values())
+    scores = {
+        pid: score_prediction(result["text"], golds[pid])
+        for pid, result in done.items()
+        if golds.get(pid)
+    }
+    return {
+        "docs": len(done),
+        "errors": {pid: r["error"] for pid, r in results.items() if "error" in r},
+        "pages": pages,
+        "total_seconds": round(total_seconds, 3),
+        "setup_seconds": round(total_seconds - extract_seconds, 3),
+        "docs_per_sec": round(len(done) / extract_seconds, 3) if extract_seconds else 0.0,
+        "pages_per_sec": round(pages / extract_seconds, 3) if extract_seconds else 0.0,
+        "p50_seconds": round(percentile(latencies, 50), 4),
+        "p95_seconds": round(percentile(latencies, 95), 4),
+        "peak_rss_mb": round(peak_rss, 1),
+        "mean_score": round(statistics.mean(scores.values()), 3) if scores else None,
+        "scores": scores,
+    }
+
+
+def main(
+    pdf_path: pathlib.Path = pathlib.Path("assets/preprints/pdf"),
+    ids_path: pathlib.Path = pathlib.Path("datasets/curated"),
+    gold_path: pathlib.Path = pathlib.Path("assets/preprints/json"),
+    output_file: pathlib.Path = pathlib.Path("metrics/extraction-benchmark.json"),
+    backend: list[str] = BACKENDS,  # Backends to benchmark; repeat to choose several
+    fast: bool = False,  # Use the fast docling mode (no OCR or table structure)
+    max_pages: int | None = None,  # Only extract this many pages with PyMuPDF
+) -> None:
+    """Benchmark the PDF-to-text backends on a set of preprints."""
+    # Benchmark the PDFs named by the files in the ID directory (e.g. W123.txt)
+    ids = sorted(path.stem for path in ids_path.iterdir())
+    pdf_paths = [pdf_path / f"{pid}.pdf" for pid in ids]
+    pdf_paths = [path for path in pdf_paths if path.is_file()]
+    print(f"Benchmarking {len(pdf_paths)} of {len(ids)} PDFs.")
+
+    # Ground truth metadata for scoring, when available
+    from core import get_cocina_affiliations
+
+    golds = {}
+    for pid in ids:
+        cocina_path = gold_path / f"{pid}.json"
+        if cocina_path.is_file():
+            golds[pid] = get_cocina_affiliations(json.loads(cocina_path.read_text("utf-8")))
+
+    metrics = {}
+    for name in backend:
+        print(f"Running {name}...")
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            results, total_seconds, peak_rss = executor.submit(
+                run_backend, name, pdf_paths, fast, max_pages
+            ).result()
+        metrics[name] = summarize(results, total_seconds, peak_rss, golds)
+        for pid, error in metrics[name]["errors"].items():
+            print(f"[red]{name} failed on {pid}: {error}[/red]")
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    output_file.write_text(
+        json.dumps(
+            {"options": {"fast": fast, "max_pages": max_pages}, "backends": metrics},
+            indent=2,
+        )
+    )
+
+    columns = [
+        "docs_per_sec",
+        "pages_per_sec",
+        "p50_seconds",
+        "p95_seconds",
+        "peak_rss_mb",
+        "mean_score",
+    ]
+    table = Table("backend", *columns)
+    for name, backend_metrics in metrics.items():
+        table.add_row(name, *[str(backend_metrics[column]) for column in columns])
+    print(table)
+    print(f"Saved metrics to {output_file}.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+
+import typer
+from rich import print
+from rich.table import Table
+
+# Modules that the pipeline only needs for some features, and that shouldn't
+# be imported along with it
+FORBIDDEN_MODULES = ["streamlit", "networkx", "Levenshtein", "pymupdf"]
+
+
+def parse_importtime(output: str) -> list[tuple[str, int, int, int]]:
+    """Parse `python -X importtime` output into (module, depth, self, cumulative) rows."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def import_subtree(
+    rows: list[tuple[str, int, int, int]], module: str
+) -> list[tuple[str, int, int, int]]:
+    """Get the rows for a module and everything imported because of it."""
+    # Modules are listed after everything they import, so the subtree is the
+    # rows between the module and the previous top-level module
+    end = next(i for i, row in enumerate(rows) if row[0] == module and row[1] == 0)
+    start = end
+    while start > 0 and rows[start - 1][1] > 0:
+        start -= 1
+    return rows[start : end + 1]
+
+
+def time_import(module: str, scripts_path: pathlib.Path) -> list[tuple[str, int, int, int]]:
+    """Import a module in a fresh interpreter and get its import times."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": str(scripts_path.resolve())},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def main(
+    module: list[str] = ["core"],  # Modules to benchmark; repeat to choose several
+    scripts_path: pathlib.Path = pathlib.Path("scripts"),
+    output_file: pathlib.Path = pathlib.Path("metrics/import-time.json"),
+    runs: int = 5,  # Imports to time per module; the median is reported
+    budget_ms: float | None = None,  # Fail if an import takes longer than this
+    top: int = 10,  # Number of slowest direct dependencies to show
+) -> None:
+    """Benchmark how long the pipeline modules take to import, for checks in CI."""
+    metrics = {}
+    failed = False
+    for name in module:
+        # Run once first so that bytecode compilation isn't timed
+        time_import(name, scripts_path)
+        timings = []
+        for _ in range(runs):
+            rows = import_subtree(time_import(name, scripts_path), name)
+            timings.append(rows[-1][3])
+
+        # The slowest modules imported directly by this one, from the last run
+        imported = {row[0] for row in rows}
+        forbidden = [m for m in FORBIDDEN_MODULES if m in imported]
+        dependencies = sorted(
+            (row for row in rows if row[1] == 1), key=lambda row: row[3], reverse=True
+        )
+        metrics[name] = {
+            "median_ms": round(statistics.median(timings) / 1000, 1),
+            "min_ms": round(min(timings) / 1000, 1),
+            "modules": len(rows),
+            "forbidden": forbidden,
+            "slowest": {row[0]: round(row[3] / 1000, 1) for row in dependencies[:top]},
+        }
+
+        table = Table("dependency", "cumulative ms", title=f"import {name}")
+        for dependency, ms in metrics[name]["slowest"].items():
+            table.add_row(dependency, str(ms))
+        print(table)
+        print(
+            f"Imported {name} in {metrics[name]['median_ms']} ms "
+            f"({len(rows)} modules, median of {runs} runs)."
+        )
+        if forbidden:
+            print(f"[red]Importing {name} also imports {', '.join(forbidden)}.[/red]")
+            failed = True
+        if budget_ms is not None and metrics[name]["median_ms"] > budget_ms:
+            print(f"[red]Importing {name} takes over {budget_ms} ms.[/red]")
+            failed = True
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    output_file.write_text(json.dumps(metrics, indent=2))
+    if failed:
+        raise typer.Exit(code=1)
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+import json
+import pathlib
+import statistics
+import time
+
+import spacy
+import typer
+from benchmark_extraction import percentile
+from core import get_affiliation_spans_many, get_cocina_affiliations, select_spancat_blocks_many
+from rich import print
+from rich.table import Table
+
+
+def select_spans(engine: str, nlp: spacy.language.Language, text: str, threshold: float):
+    """Pick out the affiliation blocks of a document, without NER."""
+    if engine == "spancat":
+        return [span for span, _doc in next(select_spancat_blocks_many([text], nlp, threshold))]
+    return next(get_affiliation_spans_many([text.split("\n")], nlp, threshold))
+
+
+def main(
+    preprints_path: pathlib.Path = pathlib.Path("assets/preprints/txt"),
+    ids_path: pathlib.Path = pathlib.Path("datasets/curated"),
+    gold_path: pathlib.Path = pathlib.Path("assets/preprints/json"),
+    textcat_model: pathlib.Path = pathlib.Path("training/textcat/model-best"),
+    spancat_model: pathlib.Path = pathlib.Path("training/spancat/model-best"),
+    output_file: pathlib.Path = pathlib.Path("metrics/inference-benchmark.json"),
+    threshold: float = 0.75,
+) -> None:
+    """Benchmark picking out affiliation blocks per block with textcat and per page with spancat."""
+    from evaluate_extraction import score_prediction
+
+    # Benchmark the preprints named by the files in the ID directory (e.g. W123.txt)
+    ids = sorted(path.stem for path in ids_path.iterdir())
+    texts = {
+        pid: (preprints_path / f"{pid}.txt").read_text(encoding="utf-8")
+        for pid in ids
+        if (preprints_path / f"{pid}.txt").is_file()
+    }
+    golds = {}
+    for pid in texts:
+        cocina_path = gold_path / f"{pid}.json"
+        if cocina_path.is_file():
+            golds[pid] = get_cocina_affiliations(json.loads(cocina_path.read_text("utf-8")))
+    print(f"Benchmarking {len(texts)} of {len(ids)} preprints.")
+
+    metrics = {}
+    for engine, model_path in [("textcat", textcat_model), ("spancat", spancat_model)]:
+        print(f"Running {engine}...")
+        nlp = spacy.load(model_path)
+        # Warm up on one document so that setup isn't part of the first latency
+        select_spans(engine, nlp, next(iter(texts.values()), ""), threshold)
+
+        latencies = []
+        scores = {}
+        for pid, text in texts.items():
+            start = time.perf_counter()
+            spans = select_spans(engine, nlp, text, threshold)
+            latencies.append(time.perf_counter() - start)
+            if golds.get(pid):
+                scores[pid] = score_prediction(" ".join(spans), golds[pid])
+
+        # textcat sees every block on its own, spancat every page at once
+        model_docs = sum(
+            len(text.split("\n\n")) if engine == "spancat" else len(text.split("\n"))
+            for text in texts.values()
+        )
+        seconds = sum(latencies)
+        metrics[engine] = {
+            "docs": len(texts),
+            "model_docs": model_docs,
+            "seconds": round(seconds, 3),
+            "docs_per_sec": round(len(texts) / seconds, 3) if seconds else 0.0,
+            "p50_seconds": round(percentile(latencies, 50), 4),
+            "p95_seconds": round(percentile(latencies, 95), 4),
+            "mean_score": round(statistics.mean(scores.values()), 3) if scores else None,
+            "scores": scores,
+        }
+
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    output_file.write_text(json.dumps({"threshold": threshold, "engines": metrics}, indent=2))
+
+    columns = ["model_docs", "docs_per_sec", "p50_seconds", "p95_seconds", "mean_score"]
+    table = Table("engine", *columns)
+    for engine, engine_metrics in metrics.items():
+        table.add_row(engine, *[str(engine_metrics[column]) for column in columns])
+    print(table)
+    print(f"Saved metrics to {output_file}.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+import pathlib
+import timeit
+
+import typer
+from clean_preprints_pymupdf import NORM_FNS, pdf_path_to_struct, text_from_struct
+from rich import print
+from rich.progress import track
+from rich.table import Table
+
+
+def chained_text_from_struct(pdf_struct: list) -> str:
+    """The original text_from_struct: run each normalization function in turn."""
+    for fn in NORM_FNS:
+        pdf_struct = fn(pdf_struct)
+    output_txt = ""
+    for page in pdf_struct:
+        for block in page:
+            output_txt += f"{block}\n"
+        output_txt += "\n"
+    return output_txt
+
+
+def main(
+    input_dir: pathlib.Path,
+    limit: int = 20,  # Maximum number of PDFs to benchmark with
+    repeat: int = 5,  # Number of timing runs per PDF; the fastest is kept
+) -> None:
+    """Compare the fused normalization against the chained normalization functions."""
+    pdf_paths = list(sorted(input_dir.glob("**/*.pdf")))[:limit]
+    pdf_structs = {}
+    for pdf_path in track(pdf_paths, description="Extracting PDFs..."):
+        try:
+            pdf_structs[pdf_path] = pdf_path_to_struct(pdf_path)
+        except Exception as e:
+            print(f"Skipping {pdf_path}: {e}")
+
+    # Make sure both implementations agree before timing them
+    for pdf_path, pdf_struct in pdf_structs.items():
+        if chained_text_from_struct(pdf_struct) != text_from_struct(pdf_struct):
+            print(f"[red]Output differs for {pdf_path}[/red]")
+            raise typer.Exit(code=1)
+
+    table = Table("implementation", "total (ms)", "per PDF (ms)", "speedup")
+    timings = {}
+    for name, fn in [("chained", chained_text_from_struct), ("fused", text_from_struct)]:
+        timings[name] = sum(
+            min(timeit.repeat(lambda: fn(pdf_struct), number=1, repeat=repeat))
+            for pdf_struct in pdf_structs.values()
+        )
+    for name, seconds in timings.items():
+        table.add_row(
+            name,
+            f"{seconds * 1000:.1f}",
+            f"{seconds * 1000 / max(len(pdf_structs), 1):.2f}",
+            f"{timings['chained'] / seconds:.2f}x",
+        )
+    print(f"Normalized {len(pdf_structs)} PDFs with identical output.")
+    print(table)
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
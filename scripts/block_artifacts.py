@@ -0,0 +1,50 @@
+import json
+import pathlib
+from typing import Iterable
+
+# Block artifacts are JSONL files with one line per page of a PDF, e.g.:
+# {"page": 0, "blocks": [{"bbox": [x0, y0, x1, y1], "lines": [[span, ...], ...]}]}
+# where each span is [text, font size, superscript]. Span text is stored as it
+# appears in the PDF struct, so the struct can be rebuilt without the PDF.
+BLOCKS_SUFFIX = ".jsonl"
+
+
+def blocks_path(blocks_dir: pathlib.Path, stem: str) -> pathlib.Path:
+    return pathlib.Path(blocks_dir, f"{stem}{BLOCKS_SUFFIX}")
+
+
+def blocks_to_jsonl(pages: Iterable[list[dict]]) -> str:
+    """Serialize the block records of each page, one page per line."""
+    return "".join(
+        json.dumps({"page": i, "blocks": blocks}, ensure_ascii=False, separators=(",", ":"))
+        + "\n"
+        for i, blocks in enumerate(pages)
+    )
+
+
+def read_blocks(path: pathlib.Path) -> list[list[dict]]:
+    """Load the block records of each page from an artifact."""
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line)["blocks"] for line in file if line.strip()]
+
+
+def record_to_block(record: dict) -> list[list[str]]:
+    """Get a block record as it appears in the PDF struct: lines of span texts."""
+    return [[span[0] for span in line] for line in record["lines"]]
+
+
+def blocks_to_struct(pages: Iterable[list[dict]]) -> list:
+    """Rebuild the PDF struct from the block records of each page."""
+    return [[record_to_block(record) for record in page] for page in pages]
+
+
+def block_layout(record: dict) -> dict:
+    """Summarize the layout of a block record: its bbox, font size and markers."""
+    spans = [span for line in record["lines"] for span in line]
+    # The font size of the longest span, so that superscripts don't count
+    main_span = max(spans, key=lambda span: len(span[0]), default=None)
+    return {
+        "bbox": record["bbox"],
+        "font_size": main_span[1] if main_span else 0.0,
+        "has_superscript": any(span[2] for span in spans),
+    }
@@ -0,0 +1,207 @@
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Callable
+
+# Set MEMOIZE=0 (or call set_memoize_enabled) to turn off memoization everywhere
+memoize_enabled = os.environ.get("MEMOIZE", "1") != "0"
+
+
+# Model IDs for loaded pipelines, since serializing their config and weights
+# isn't free
+_model_ids = weakref.WeakKeyDictionary()
+
+
+def model_id(nlp) -> str | None:
+    """Identify a spaCy pipeline by its name, version, configuration and weights."""
+    # Other models, like the pre-filter, can identify themselves
+    if nlp is None:
+        return None
+    if hasattr(nlp, "model_id"):
+        return nlp.model_id
+    if nlp not in _model_ids:
+        # Retraining rewrites model-best in place with the same config, so the
+        # weights have to be part of the ID. Hash each component on its own
+        # rather than the whole pipeline at once, to keep the copy small
+        digest = hashlib.sha256(nlp.config.to_str().encode("utf-8"))
+        digest.update(nlp.vocab.vectors.to_bytes())
+        for _name, pipe in nlp.pipeline:
+            if hasattr(pipe, "to_bytes"):
+                digest.update(pipe.to_bytes(exclude=["vocab"]))
+        meta = nlp.meta
+        _model_ids[nlp] = (
+            f"{meta['lang']}_{meta['name']}-{meta['version']}-{digest.hexdigest()[:12]}"
+        )
+    return _model_ids[nlp]
+
+
+def text_hash(text: str | list[str]) -> str:
+    """Hash a text, or a list of texts."""
+    digest = hashlib.sha256()
+    for part in [text] if isinstance(text, str) else text:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def set_memoize_enabled(enabled: bool) -> None:
+    global memoize_enabled
+    memoize_enabled = enabled
+
+
+def memoize(key: Callable[..., tuple], max_entries: int = 32) -> Callable:
+    """
+    Cache a function's results under keys computed from its arguments by `key`,
+    which gets the same arguments. The least recently used results are evicted
+    once there are more than max_entries; set it to 0 to turn the cache off.
+    Results are copied on the way out, so callers can modify them.
+    """
+
+    def decorator(fn: Callable) -> Callable:
+        signature = inspect.signature(fn)
+        results = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not memoize_enabled or wrapper.max_entries <= 0:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache_key = key(*bound.args, **bound.kwargs)
+            # Callers can be on different threads (Streamlit, FastAPI's
+            # threadpool), but the function runs outside the lock so that
+            # misses don't wait on each other
+            with lock:
+                found = cache_key in results
+                if found:
+                    results.move_to_end(cache_key)
+                    result = results[cache_key]
+                    wrapper.hits += 1
+                else:
+                    wrapper.misses += 1
+            if not found:
+                result = fn(*args, **kwargs)
+                with lock:
+                    results[cache_key] = result
+                    while len(results) > wrapper.max_entries:
+                        results.popitem(last=False)
+            return copy.deepcopy(result)
+
+        def cache_clear() -> None:
+            with lock:
+                results.clear()
+                wrapper.hits = wrapper.misses = 0
+
+        def cache_info() -> dict:
+            with lock:
+                return {"hits": wrapper.hits, "misses": wrapper.misses, "entries": len(results)}
+
+        wrapper.max_entries = max_entries
+        wrapper.hits = wrapper.misses = 0
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_info = cache_info
+        return wrapper
+
+    return decorator
+
+
+def block_key(model: str, text: str) -> str:
+    """Key a block's prediction by the model and the block's text."""
+    # Stored entity offsets point into the text as it was, so don't normalize it
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class BlockPredictionCache:
+    """Predictions for blocks, kept in memory and optionally in a shared SQLite file."""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,  # Size of the in-memory tier
+        path: pathlib.Path | None = None,  # SQLite database for the on-disk tier
+    ):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._db = None
+        self._db_pid = None
+
+    @property
+    def db(self) -> sqlite3.Connection | None:
+        # Connections can't be shared with forked processes, so each process
+        # opens its own; WAL mode lets them read while another one writes
+        if self.path is None:
+            return None
+        if self._db is None or self._db_pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._db_pid = os.getpid()
+        return self._db
+
+    def get(self, model: str, text: str) -> dict | None:
+        """Get the stored prediction for a block, if any."""
+        key = block_key(model, text)
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return json.loads(value)
+        if self.db is not None:
+            row = self.db.execute(
+                "SELECT value FROM predictions WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                self._remember(key, row[0])
+                self.hits += 1
+                self.disk_hits += 1
+                return json.loads(row[0])
+        self.misses += 1
+        return None
+
+    def put_many(self, model: str, predictions: list[tuple[str, dict]]) -> None:
+        """Store the predictions for a list of (text, prediction) pairs."""
+        rows = [(block_key(model, text), json.dumps(value)) for text, value in predictions]
+        for key, value in rows:
+            self._remember(key, value)
+        if self.db is not None and rows:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO predictions (key, value) VALUES (?, ?)", rows
+                )
+
+    def _remember(self, key: str, value: str) -> None:
+        """Add an entry to the in-memory tier, evicting the least recently used."""
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = value
+        self._memory_bytes += len(value)
+        while self._memory_bytes > self.max_bytes and self._memory:
+            _key, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+        }
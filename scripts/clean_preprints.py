@@ -1,15 +1,20 @@
 #!/usr/bin/env python
 
+import importlib.metadata
 import pathlib
 import re
+import sys
 import unicodedata
+from typing import Iterator
 
 import regex
 import spacy
 import typer
-from docling.datamodel.base_models import InputFormat
+from docling.datamodel.base_models import ConversionStatus, InputFormat
 from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.datamodel.settings import settings
 from docling.document_converter import PdfFormatOption
+from extraction_manifest import ExtractionManifest, extractor_config
 from rich import print
 from rich.progress import track
 from spacy_layout import spaCyLayout
@@ -71,42 +76,124 @@ def doc_to_text(doc: spacy.tokens.Doc) -> str:
     return "\n\n".join(pages)
 
 
-def main(input_dir: pathlib.Path, output_dir: pathlib.Path) -> None:
+def docling_options(fast: bool = False) -> dict | None:
+    """Get the docling format options for the layout parser."""
+    if not fast:
+        return None
+
+    # Turn off table structure and OCR for the PDF pipeline for speed; PDFs
+    # that have no text layer will come out empty
+    docling_pipeline_options = PdfPipelineOptions()
+    docling_pipeline_options.do_ocr = False
+    docling_pipeline_options.do_table_structure = False
+    return {
+        InputFormat.PDF: PdfFormatOption(pipeline_options=docling_pipeline_options)
+    }
+
+
+def convert_pdfs(
+    layout: spaCyLayout,
+    pdf_paths: list[pathlib.Path],
+    batch_size: int,
+    page_range: tuple[int, int],
+) -> Iterator[tuple[pathlib.Path, spacy.tokens.Doc | None, str | None]]:
+    """Convert PDFs in batches, yielding (path, doc, error) for each in order."""
+    # Goes through the docling converter directly rather than spaCyLayout.pipe,
+    # which stops at the first failure and can't limit the page range
+    for i in range(0, len(pdf_paths), batch_size):
+        batch = pdf_paths[i : i + batch_size]
+        try:
+            results = list(
+                layout.converter.convert_all(
+                    batch, raises_on_error=False, page_range=page_range
+                )
+            )
+        except Exception as e:
+            # Retry the PDFs one at a time so that one bad file can't sink the batch
+            if len(batch) > 1:
+                yield from convert_pdfs(layout, batch, 1, page_range)
+            else:
+                yield batch[0], None, str(e)
+            continue
+
+        results_by_stem = {result.input.file.stem: result for result in results}
+        for path in batch:
+            result = results_by_stem.get(path.stem)
+            if result is None:
+                yield path, None, "no conversion result"
+            elif result.status not in {
+                ConversionStatus.SUCCESS,
+                ConversionStatus.PARTIAL_SUCCESS,
+            }:
+                yield path, None, f"conversion status {result.status.value}"
+            else:
+                try:
+                    doc = layout(result.document)
+                except Exception as e:
+                    yield path, None, str(e)
+                else:
+                    yield path, doc, None
+
+
+def main(
+    input_dir: pathlib.Path,
+    output_dir: pathlib.Path,
+    incremental: bool = False,  # Only extract PDFs that changed since the last run
+    fast: bool = False,  # Skip OCR and table structure recognition
+    first_page: int = 1,  # First page of each PDF to extract, counting from 1
+    last_page: int | None = None,  # Last page of each PDF to extract
+    batch_size: int = 8,  # Number of PDFs to convert together
+) -> None:
     """Extract text from all PDFs, normalize, and output to text files."""
     # Set up the layout parser
     nlp = spacy.blank("en")
-
-    # Turn off table structure and OCR for the PDF pipeline for speed
-    # FIXME this causes errors that breaks processing
-    # docling_pipeline_options = PdfPipelineOptions()
-    # docling_pipeline_options.do_ocr = False
-    # docling_pipeline_options.do_table_structure = False
-    # docling_format_options = {
-    #     InputFormat.PDF: PdfFormatOption(pipeline_options=docling_pipeline_options)
-    # }
-    # layout = spaCyLayout(nlp, docling_options=docling_format_options)
-    layout = spaCyLayout(nlp)
+    layout = spaCyLayout(nlp, docling_options=docling_options(fast))
+    settings.perf.doc_batch_size = batch_size
+    page_range = (first_page, last_page or sys.maxsize)
 
     # Create output directory if it doesn't exist
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Clear text files in output directory
-    for txt_path in output_dir.glob("*.txt"):
-        txt_path.unlink()
+    # Outputs depend on the PDF, the extraction code, and the layout parser
+    pdf_paths = list(sorted(input_dir.glob("**/*.pdf")))
+    manifest = ExtractionManifest(output_dir)
+    config = extractor_config(
+        f"spacy-layout-{importlib.metadata.version('spacy-layout')}",
+        [*NORM_FNS, clean_span, doc_to_text, docling_options],
+        fast=fast,
+        first_page=first_page,
+        last_page=last_page,
+    )
+
+    # Either keep unchanged outputs and remove those without a PDF, or clear
+    # all text files in output directory
+    if incremental:
+        pruned = manifest.prune(pdf_paths)
+        all_paths = pdf_paths
+        pdf_paths = [path for path in pdf_paths if not manifest.is_current(path, config)]
+        print(
+            f"Skipping {len(all_paths) - len(pdf_paths)} unchanged PDFs; "
+            f"removed {pruned} stale outputs."
+        )
+    else:
+        manifest.clear()
 
     # Extract text from each PDF and write to text file in output directory
-    pdf_paths = list(sorted(input_dir.glob("**/*.pdf")))
-    total = len(pdf_paths)
-    try:
-        for doc, path in track(
-            zip(layout.pipe(map(str, pdf_paths)), pdf_paths),
-            description="Extracting text...",
-            total=total,
-        ):
-            output_path = pathlib.Path(output_dir, f"{path.stem}.txt")
-            output_path.write_text(doc_to_text(doc))
-    except Exception as e:
-        print(f"Error extracting text: {e}")
+    total = 0
+    for path, doc, error in track(
+        convert_pdfs(layout, pdf_paths, batch_size, page_range),
+        description="Extracting text...",
+        total=len(pdf_paths),
+    ):
+        if error:
+            print(f"Error extracting text from {path}: {error}")
+            manifest.forget(path)
+            continue
+        output_path = pathlib.Path(output_dir, f"{path.stem}.txt")
+        output_path.write_text(doc_to_text(doc))
+        manifest.record(path, config)
+        total += 1
+    manifest.save()
     print(f"Extracted text from {total} PDFs.")
 
 
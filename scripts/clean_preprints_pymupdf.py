@@ -1,64 +1,297 @@
 #!/usr/bin/env python
 
+import collections
+import os
 import pathlib
 import re
+import tempfile
+import time
 import unicodedata
-from typing import BinaryIO, Callable
+from array import array
+from collections.abc import Sequence
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import BinaryIO, Callable, Iterable, Iterator
 
 import pymupdf
 import regex
 import typer
+from block_artifacts import BLOCKS_SUFFIX, blocks_path, blocks_to_jsonl
+from extraction_manifest import ExtractionManifest, extractor_config
 from rich import print
 from rich.progress import track
 
-
-def pdf_path_to_struct(path: str) -> list:
-    doc = pymupdf.open(path)
-    pdf = pdf_to_struct(doc)
-    doc.close()
+# Patterns used by the normalization functions, compiled once up front
+NUMBERED_LINE_PATTERN = re.compile(r"^\d+\W*$")
+PUNCT_PATTERN = re.compile(r"([,;])")
+MARKER_PATTERN = re.compile(r"([*†‡§¶])")
+DIACRITIC_PATTERN = regex.compile(r" (\p{Mn})(\w)")
+NORM_PATTERNS = [NUMBERED_LINE_PATTERN, PUNCT_PATTERN, MARKER_PATTERN, DIACRITIC_PATTERN]
+
+
+def pdf_path_to_struct(
+    path: str,
+    max_pages: int | None = None,
+    stop: Callable[[list], bool] | None = None,
+    flat: bool = False,
+) -> "list | FlatPdfStruct":
+    return collect_pages(iter_pdf_path_pages(path, max_pages), stop=stop, flat=flat)
+
+
+def pdf_bytes_to_struct(
+    file: bytes,
+    max_pages: int | None = None,
+    stop: Callable[[list], bool] | None = None,
+    flat: bool = False,
+) -> "list | FlatPdfStruct":
+    return collect_pages(iter_pdf_bytes_pages(file, max_pages), stop=stop, flat=flat)
+
+
+def pdf_to_struct(
+    doc: pymupdf.Document,
+    max_pages: int | None = None,  # Stop after extracting this many pages
+    stop: Callable[[list], bool] | None = None,  # Stop once this returns True
+    flat: bool = False,  # Return a FlatPdfStruct instead of nested lists
+) -> "list | FlatPdfStruct":
+    """Extract text blocks from a PDF using PyMuPDF."""
+    return collect_pages(iter_pdf_pages(doc, max_pages), stop=stop, flat=flat)
+
+
+def iter_pdf_path_pages(path: str, max_pages: int | None = None) -> Iterator[list]:
+    """Extract text blocks from a PDF file, one page at a time."""
+    with pymupdf.open(path) as doc:
+        yield from iter_pdf_pages(doc, max_pages)
+
+
+def iter_pdf_bytes_pages(file: bytes, max_pages: int | None = None) -> Iterator[list]:
+    """Extract text blocks from PDF data, one page at a time."""
+    with pymupdf.open(stream=file) as doc:
+        yield from iter_pdf_pages(doc, max_pages)
+
+
+def iter_pdf_pages(doc: pymupdf.Document, max_pages: int | None = None) -> Iterator[list]:
+    """Extract text blocks from a PDF using PyMuPDF, one page at a time."""
+    for page_dict in iter_page_dicts(doc, max_pages):
+        yield page_dict_to_struct(page_dict)
+
+
+def iter_page_dicts(doc: pymupdf.Document, max_pages: int | None = None) -> Iterator[dict]:
+    """Extract the PyMuPDF text dict of each page of a PDF."""
+    # Pages are extracted lazily, so that we can stop early: affiliations are
+    # almost always on the first few pages and dict extraction is expensive
+    for i, page in enumerate(doc):
+        if max_pages is not None and i >= max_pages:
+            break
+        yield page.get_textpage().extractDICT(sort=True)
+
+
+def collect_pages(
+    pages: Iterable[list],
+    stop: Callable[[list], bool] | None = None,
+    flat: bool = False,
+) -> "list | FlatPdfStruct":
+    """Gather extracted pages into a struct, stopping once the condition is met."""
+    pdf = FlatPdfStruct() if flat else []
+    for page in pages:
+        pdf.append(page)
+        if stop and stop(pdf):
+            break
+    if flat:
+        pdf.finish()
     return pdf
 
 
-def pdf_bytes_to_struct(file: bytes) -> list:
-    doc = pymupdf.open(stream=file)
-    pdf = pdf_to_struct(doc)
-    doc.close()
-    return pdf
+def page_to_struct(page: pymupdf.Page) -> list:
+    """Extract text blocks from a single PDF page using PyMuPDF."""
+    return page_dict_to_struct(page.get_textpage().extractDICT(sort=True))
 
 
-def pdf_to_struct(doc: pymupdf.Document) -> list:
-    """Extract text blocks from a PDF using PyMuPDF."""
+def page_dict_to_struct(page_dict: dict) -> list:
+    """Convert the PyMuPDF text dict of a page to a list of text blocks."""
     # Span-by-span extraction (credit to @jcoyne) in order to ensure things like
     # affiliation markers are tokenized correctly with space around them
-    pdf = []
-    for page in doc:
-        blocks = []
-        dict = page.get_textpage().extractDICT(sort=True)
-        for block in dict["blocks"]:
-            lines = []
-            for line in block["lines"]:
-                spans = []
-                for i, span in enumerate(line["spans"]):
-                    # Indicator for superscript text; see:
-                    # https://pymupdf.readthedocs.io/en/latest/recipes-text.html#how-to-analyze-font-characteristics
-                    # Add a space so that it is tokenized separately
-                    if span["flags"] & 2**0:
-                        spans.append(f" {span["text"]}")
-                    # Special case: a single lowercase letter/number at the
-                    # beginning of a line is likely superscript, but pymupdf
-                    # sometimes doesn't flag it as such; unclear why...
-                    elif len(span["text"]) == 1 and span["text"].isalnum() and i == 0:
-                        spans.append(f"{span['text']} ")
-                    else:
-                        spans.append(span["text"])
-                lines.append(spans)
-            blocks.append(lines)
-        pdf.append(blocks)
-    return pdf
+    return [
+        [
+            [span_text(span, i) for i, span in enumerate(line["spans"])]
+            for line in block["lines"]
+        ]
+        for block in page_dict["blocks"]
+    ]
+
+
+def page_dict_to_blocks(page_dict: dict) -> list[dict]:
+    """Convert the PyMuPDF text dict of a page to block records for an artifact."""
+    # See block_artifacts for the format
+    return [
+        {
+            "bbox": [round(x, 2) for x in block["bbox"]],
+            "lines": [
+                [
+                    [span_text(span, i), round(span["size"], 2), is_superscript(span)]
+                    for i, span in enumerate(line["spans"])
+                ]
+                for line in block["lines"]
+            ],
+        }
+        for block in page_dict["blocks"]
+    ]
+
+
+def is_superscript(span: dict) -> bool:
+    # Indicator for superscript text; see:
+    # https://pymupdf.readthedocs.io/en/latest/recipes-text.html#how-to-analyze-font-characteristics
+    return bool(span["flags"] & 2**0)
+
+
+def span_text(span: dict, i: int) -> str:
+    """Get the text of the i-th span in a line, spaced out if it is a marker."""
+    # Add a space so that superscript is tokenized separately
+    if is_superscript(span):
+        return f" {span['text']}"
+    # Special case: a single lowercase letter/number at the
+    # beginning of a line is likely superscript, but pymupdf
+    # sometimes doesn't flag it as such; unclear why...
+    if len(span["text"]) == 1 and span["text"].isalnum() and i == 0:
+        return f"{span['text']} "
+    return span["text"]
+
+
+class FlatPdfStruct(Sequence):
+    """
+    Compact alternative to the nested page/block/line/span lists, which stores
+    all span text in a single string plus an array of boundaries for each level.
+    Indexing and iterating yields lightweight views that behave like the lists.
+    """
+
+    __slots__ = (
+        "_text",
+        "_parts",
+        "_length",
+        "span_offsets",
+        "line_offsets",
+        "block_offsets",
+        "page_offsets",
+    )
+
+    def __init__(self):
+        # Item i at each level runs from offsets[i] to offsets[i + 1], counted
+        # in characters for spans and in items of the level below otherwise.
+        # The text of appended pages is joined once it's needed, rather than
+        # copying the whole string on every append
+        self._text = ""
+        self._parts = []
+        self._length = 0
+        self.span_offsets = array("I", [0])
+        self.line_offsets = array("I", [0])
+        self.block_offsets = array("I", [0])
+        self.page_offsets = array("I", [0])
+
+    def append(self, page: list) -> None:
+        """Add a page in the nested list format returned by page_to_struct."""
+        spans = []
+        end = self._length
+        for block in page:
+            for line in block:
+                for span in line:
+                    spans.append(span)
+                    end += len(span)
+                    self.span_offsets.append(end)
+                self.line_offsets.append(len(self.span_offsets) - 1)
+            self.block_offsets.append(len(self.line_offsets) - 1)
+        self.page_offsets.append(len(self.block_offsets) - 1)
+        self._parts.extend(spans)
+        self._length = end
+
+    @property
+    def text(self) -> str:
+        """All span text, one span after another."""
+        self.finish()
+        return self._text
+
+    def finish(self) -> None:
+        """Join the text of the pages appended since the last join."""
+        if self._parts:
+            self._text = "".join([self._text, *self._parts])
+            self._parts = []
+
+    def to_list(self) -> list:
+        """Convert to the nested list format."""
+        return [[[list(line) for line in block] for block in page] for page in self]
+
+    def __len__(self) -> int:
+        return len(self.page_offsets) - 1
+
+    def __getitem__(self, index):
+        indices = range(len(self))[index]
+        if isinstance(index, slice):
+            return [self._item(i) for i in indices]
+        return self._item(indices)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._item(i)
+
+    def _item(self, i: int) -> "FlatPage":
+        return FlatPage(self, self.page_offsets[i], self.page_offsets[i + 1])
+
+
+class _FlatView(Sequence):
+    """A range of items at one level of a FlatPdfStruct."""
+
+    __slots__ = ("_pdf", "_start", "_stop")
+
+    def __init__(self, pdf: FlatPdfStruct, start: int, stop: int):
+        self._pdf = pdf
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    def __getitem__(self, index):
+        indices = range(self._start, self._stop)[index]
+        if isinstance(index, slice):
+            return [self._item(i) for i in indices]
+        return self._item(indices)
+
+    def __iter__(self):
+        for i in range(self._start, self._stop):
+            yield self._item(i)
 
+    def __repr__(self) -> str:
+        return repr(list(self))
 
-def clean_pdf_struct(pdf_struct: list, norm_fns: list[Callable[[str], str]]):
+
+class FlatPage(_FlatView):
+    __slots__ = ()
+
+    def _item(self, i: int) -> "FlatBlock":
+        offsets = self._pdf.block_offsets
+        return FlatBlock(self._pdf, offsets[i], offsets[i + 1])
+
+
+class FlatBlock(_FlatView):
+    __slots__ = ()
+
+    def _item(self, i: int) -> "FlatLine":
+        offsets = self._pdf.line_offsets
+        return FlatLine(self._pdf, offsets[i], offsets[i + 1])
+
+
+class FlatLine(_FlatView):
+    __slots__ = ()
+
+    def _item(self, i: int) -> str:
+        offsets = self._pdf.span_offsets
+        return self._pdf.text[offsets[i] : offsets[i + 1]]
+
+
+def clean_pdf_struct(pdf_struct: "list | FlatPdfStruct", norm_fns: list[Callable[[str], str]]):
     """Apply normalization steps to a structured PDF."""
+    # The default chain has a fused implementation that gives the same output
+    if list(norm_fns) == NORM_FNS:
+        return [normalize_page(page) for page in pdf_struct]
     for fn in norm_fns:
         pdf_struct = fn(pdf_struct)
     return pdf_struct
@@ -87,9 +320,9 @@ def space_after_punct(pdf_struct: list) -> list:
             new_block = []
             for line in block:
                 # Might have numbers or symbols immediately after
-                new_line = re.sub(r"([,;])", r"\1 ", line)
+                new_line = PUNCT_PATTERN.sub(r"\1 ", line)
                 # Commonly used to link authors to affiliations
-                new_line = re.sub(r"([*†‡§¶])", r" \1 ", new_line)
+                new_line = MARKER_PATTERN.sub(r" \1 ", new_line)
                 new_block.append(new_line)
             new_page.append(new_block)
         new_struct.append(new_page)
@@ -106,7 +339,7 @@ def remove_numbered_lines(pdf_struct: list) -> list:
             for line in block:
                 # If the line has a single span that is a number, skip it,
                 # as it is likely a line number
-                if len(line) == 1 and re.match(r"^\d+\W*$", line[0]):
+                if len(line) == 1 and NUMBERED_LINE_PATTERN.match(line[0]):
                     continue
                 new_block.append(line)
             new_page.append(new_block)
@@ -150,7 +383,7 @@ def fix_diacritics(text: str) -> str:
     # We then use a regex to remove the space and swap the combining diacritic
     # with the character it modifies, so that the modifier follows the character.
     decomposed = unicodedata.normalize("NFKD", text)
-    return regex.sub(r" (\p{Mn})(\w)", r"\2\1", decomposed)
+    return DIACRITIC_PATTERN.sub(r"\2\1", decomposed)
 
 
 def fix_diacritics_struct(pdf_struct: list) -> list:
@@ -165,46 +398,238 @@ def fix_diacritics_struct(pdf_struct: list) -> list:
     return new_struct
 
 
-def text_from_struct(pdf_struct: dict) -> str:
-    cleaned_pdf_struct = clean_pdf_struct(
-        pdf_struct,
-        [
-            remove_numbered_lines,
-            collapse_spans,
-            space_after_punct,
-            collapse_lines,
-            collapse_whitespace,
-            fix_diacritics_struct,
-        ],
-    )
-    output_txt = ""
-    for page in cleaned_pdf_struct:
-        for block in page:
-            output_txt += f"{block}\n"
-        output_txt += "\n"
-    return output_txt
+NORM_FNS = [
+    remove_numbered_lines,
+    collapse_spans,
+    space_after_punct,
+    collapse_lines,
+    collapse_whitespace,
+    fix_diacritics_struct,
+]
 
 
-def main(input_dir: pathlib.Path, output_dir: pathlib.Path) -> None:
+def normalize_page(page: list) -> list[str]:
+    """Apply all of NORM_FNS to a single page in one pass over its blocks."""
+    new_page = []
+    for block in page:
+        new_block = normalize_block(block)
+        if new_block:
+            new_page.append(new_block)
+    return new_page
+
+
+def normalize_block(block: list) -> str:
+    """Apply all of NORM_FNS to a single block; empty if it would be removed."""
+    # remove_numbered_lines + collapse_spans
+    lines = [
+        "".join(line)
+        for line in block
+        if not (len(line) == 1 and NUMBERED_LINE_PATTERN.match(line[0]))
+    ]
+    # collapse_lines; space_after_punct only inserts spaces around single
+    # characters, so it can run on the joined block instead of each line
+    new_block = " ".join(lines)
+    new_block = PUNCT_PATTERN.sub(r"\1 ", new_block)
+    new_block = MARKER_PATTERN.sub(r" \1 ", new_block)
+    # collapse_whitespace + fix_diacritics_struct
+    if not new_block.strip():
+        return ""
+    return fix_diacritics(" ".join(new_block.split()))
+
+
+def iter_clean_pages(pages: Iterable[list]) -> Iterator[list[str]]:
+    """Normalize extracted pages as they arrive, yielding the blocks of each."""
+    for page in pages:
+        yield normalize_page(page)
+
+
+def text_from_struct(pdf_struct: "list | FlatPdfStruct") -> str:
+    output = []
+    for page in iter_clean_pages(pdf_struct):
+        for block in page:
+            output.append(f"{block}\n")
+        output.append("\n")
+    return "".join(output)
+
+
+def write_text_atomic(path: pathlib.Path, text: str) -> None:
+    """Write text to a file so that readers never see a partial file."""
+    with tempfile.NamedTemporaryFile(
+        "w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False
+    ) as tmp:
+        tmp.write(text)
+    os.replace(tmp.name, path)
+
+
+def extract_pdf(
+    pdf_path: pathlib.Path,
+    output_dir: pathlib.Path,
+    max_pages: int | None = None,
+    blocks_dir: pathlib.Path | None = None,
+) -> dict:
+    """Extract text from a single PDF and write it to the output directory."""
+    # Errors are returned rather than raised so that they can be reported
+    # from a worker process without taking down the whole pool
+    output_path = pathlib.Path(output_dir, f"{pdf_path.stem}.txt")
+    try:
+        pdf_struct = FlatPdfStruct()
+        block_pages = []
+        with pymupdf.open(pdf_path) as doc:
+            for page_dict in iter_page_dicts(doc, max_pages):
+                pdf_struct.append(page_dict_to_struct(page_dict))
+                if blocks_dir:
+                    block_pages.append(page_dict_to_blocks(page_dict))
+        text = text_from_struct(pdf_struct)
+        write_text_atomic(output_path, text)
+        if blocks_dir:
+            write_text_atomic(
+                blocks_path(blocks_dir, pdf_path.stem), blocks_to_jsonl(block_pages)
+            )
+        return {"path": pdf_path, "output": output_path, "error": None}
+    except Exception as e:
+        return {"path": pdf_path, "output": None, "error": str(e) or repr(e)}
+
+
+def extract_pdfs(
+    extract_fn: Callable[[pathlib.Path], dict],
+    pdf_paths: Iterable[pathlib.Path],
+    workers: int = 1,
+    timeout: float | None = None,  # Give up on a PDF after this many seconds
+) -> Iterator[dict]:
+    """Run extraction over PDFs, yielding results as they complete."""
+    if workers <= 1 and not timeout:
+        yield from map(extract_fn, pdf_paths)
+        return
+
+    # A PDF can hang inside MuPDF, where nothing in the worker can interrupt
+    # it, so the timeout is enforced from here. Only one PDF per worker is
+    # submitted at a time, so each starts right away and is timed from when it
+    # was submitted. When a PDF runs over or a worker dies, the pool is killed
+    # and replaced, and the other PDFs it was working on start again
+    queue = collections.deque(pdf_paths)
+    running = {}  # Futures, with their PDF and deadline
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        while queue or running:
+            while queue and len(running) < workers:
+                path = queue.popleft()
+                deadline = time.monotonic() + timeout if timeout else None
+                running[executor.submit(extract_fn, path)] = (path, deadline)
+
+            deadlines = [deadline for _path, deadline in running.values() if deadline]
+            wait_time = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+            done, _pending = wait(running, timeout=wait_time, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                path, _deadline = running.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:  # worker died, e.g. a segfault in MuPDF
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    yield {"path": path, "output": None, "error": repr(e)}
+
+            now = time.monotonic()
+            for future, (path, deadline) in list(running.items()):
+                if deadline and deadline <= now and not future.done():
+                    del running[future]
+                    broken = True
+                    yield {"path": path, "output": None, "error": f"timed out after {timeout}s"}
+            if broken:
+                queue.extendleft(reversed([path for path, _deadline in running.values()]))
+                running.clear()
+                kill_pool(executor)
+                executor = ProcessPoolExecutor(max_workers=workers)
+    finally:
+        kill_pool(executor)
+
+
+def kill_pool(executor: ProcessPoolExecutor) -> None:
+    """Shut down a process pool now, even if its workers are stuck."""
+    # ProcessPoolExecutor has no public way to do this before Python 3.14
+    for process in list((executor._processes or {}).values()):
+        process.kill()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+def main(
+    input_dir: pathlib.Path,
+    output_dir: pathlib.Path,
+    max_pages: int | None = None,  # Only extract this many pages from each PDF
+    workers: int = 1,  # Number of processes to extract PDFs with
+    timeout: float | None = None,  # Give up on a PDF after this many seconds
+    incremental: bool = False,  # Only extract PDFs that changed since the last run
+    blocks_dir: pathlib.Path | None = None,  # Also save blocks with layout as JSONL
+) -> None:
     """Extract text from all PDFs, normalize, and output to text files."""
-    # Create output directory if it doesn't exist
+    # Create output directories if they don't exist
     output_dir.mkdir(parents=True, exist_ok=True)
+    if blocks_dir:
+        blocks_dir.mkdir(parents=True, exist_ok=True)
 
-    # Clear text files in output directory
-    for txt_path in output_dir.glob("*.txt"):
-        txt_path.unlink()
+    # Outputs depend on the PDF, the extraction code, and its options
+    pdf_paths = list(sorted(input_dir.glob("**/*.pdf")))
+    manifest = ExtractionManifest(output_dir)
+    config = extractor_config(
+        f"pymupdf-{pymupdf.VersionBind}",
+        [
+            page_dict_to_struct,
+            page_dict_to_blocks,
+            span_text,
+            *NORM_FNS,
+            normalize_page,
+            normalize_block,
+            fix_diacritics,
+            text_from_struct,
+        ],
+        patterns=NORM_PATTERNS,
+        max_pages=max_pages,
+        blocks=blocks_dir is not None,
+    )
+
+    # Either keep unchanged outputs and remove those without a PDF, or clear
+    # all text files in output directory
+    if incremental:
+        pruned = manifest.prune(pdf_paths)
+        all_paths = pdf_paths
+        pdf_paths = [
+            path
+            for path in pdf_paths
+            if not manifest.is_current(path, config)
+            or (blocks_dir and not blocks_path(blocks_dir, path.stem).is_file())
+        ]
+        print(
+            f"Skipping {len(all_paths) - len(pdf_paths)} unchanged PDFs; "
+            f"removed {pruned} stale outputs."
+        )
+    else:
+        manifest.clear()
+
+    # Block artifacts are only kept for PDFs that are still around
+    if blocks_dir:
+        stems = {path.stem for path in all_paths} if incremental else set()
+        for path in blocks_dir.glob(f"*{BLOCKS_SUFFIX}"):
+            if path.stem not in stems:
+                path.unlink()
 
     # Extract text from each PDF and write to text file in output directory
-    pdf_paths = list(sorted(input_dir.glob("**/*.pdf")))
+    extract_fn = partial(
+        extract_pdf, output_dir=output_dir, max_pages=max_pages, blocks_dir=blocks_dir
+    )
     total = 0
-    for pdf_path in track(pdf_paths, description="Extracting text..."):
-        output_path = pathlib.Path(output_dir, f"{pdf_path.stem}.txt")
-        try:
-            pdf_struct = pdf_path_to_struct(pdf_path)
-            output_path.write_text(text_from_struct(pdf_struct))
+    for result in track(
+        extract_pdfs(extract_fn, pdf_paths, workers=workers, timeout=timeout),
+        description="Extracting text...",
+        total=len(pdf_paths),
+    ):
+        if result["error"]:
+            print(f"Error extracting text from {result['path']}: {result['error']}")
+            manifest.forget(result["path"])
+            if blocks_dir:
+                blocks_path(blocks_dir, result["path"].stem).unlink(missing_ok=True)
+        else:
+            manifest.record(result["path"], config)
             total += 1
-        except Exception as e:
-            print(f"Error extracting text from {pdf_path}: {e}")
+    manifest.save()
 
     print(f"Extracted text from {total} PDFs.")
 
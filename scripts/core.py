@@ -0,0 +1,1324 @@
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import pathlib
+import re
+import warnings
+from collections import defaultdict
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
+
+import spacy
+from block_artifacts import block_layout, blocks_path, read_blocks, record_to_block
+from caching import BlockPredictionCache, memoize, model_id, text_hash
+from corpus import PreprintCorpus
+from spacy.pipeline import SpanCategorizer, TextCategorizer
+from spacy.tokens import Doc, Span
+
+# networkx, Levenshtein, the spaCy matcher and PyMuPDF are imported where
+# they're used, so that importing this module stays fast
+if TYPE_CHECKING:
+    import networkx as nx
+
+# Cache for block-level predictions; see set_prediction_cache
+prediction_cache = None
+
+# Blocks are sorted by length and run in batches of up to this many tokens,
+# counting padding; "auto" sizes batches from the memory available, and 0
+# runs blocks in document order, batch_size at a time. See set_batch_tokens
+batch_tokens = os.environ.get("BATCH_TOKENS", "auto")
+
+# Sizing of "auto" batches: the share of available memory to use, the peak
+# memory per padded token, and the limits. BYTES_PER_TOKEN is an estimate, not a
+# measurement: en_core_web_trf's RoBERTa-base has a hidden size of 768 and a
+# feed-forward size of 3072, so one layer's float32 activations and attention
+# scores come to roughly 25KB per token. spacy-transformers runs overlapping
+# windows and keeps their outputs for the NER head, and allocators hold on to
+# freed memory, so this allows about ten times that. If batches run out of
+# memory or look too small, measure peak RSS at a few fixed --batch-tokens
+# values and adjust it
+AUTO_MEMORY_SHARE = 0.25
+BYTES_PER_TOKEN = 256 * 1024
+MIN_BATCH_TOKENS = 512
+MAX_BATCH_TOKENS = 32768
+DEFAULT_BATCH_TOKENS = 4096
+
+# spancat classifies every block on a page in one pass, with the model
+# suggesting the layout spans of each page, one per block. It's experimental
+# and only run by benchmark_inference.py: corpus/spancat has one block per doc
+# rather than whole pages, and the model doesn't match textcat yet. Training
+# examples get their layout spans from the layout_spans.v1 augmenter
+LAYOUT_KEY = "layout"
+SPANCAT_KEY = "sc"
+
+# Block artifacts with layout, written by the preprints:blocks command
+PREPRINT_BLOCKS_DIR = pathlib.Path(os.environ.get("PREPRINT_BLOCKS_DIR", "assets/preprints/blocks"))
+
+# Preprint texts, which are only listed and read once something asks for them
+preprint_corpus = PreprintCorpus(
+    pathlib.Path("assets/preprints/txt"),
+    max_cached=int(os.environ.get("CORPUS_CACHE_SIZE", 256)),
+)
+
+
+def __getattr__(name: str):
+    # all_preprints and all_openalex_ids used to be loaded at import time
+    if name == "all_preprints":
+        return preprint_corpus
+    if name == "all_openalex_ids":
+        return preprint_corpus.ids
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Ways of loading the NER model for different uses. Excluded components are
+# never loaded; disabled ones are loaded but don't run unless enabled again.
+# The affiliation code only reads entities and the POS tags used by
+# get_affiliation_keys, which come from the tagger and attribute_ruler
+PIPELINE_PROFILES = {
+    "api-minimal": {"exclude": ["parser", "senter", "lemmatizer"]},
+    "visualize-full": {"disable": ["parser"]},
+}
+
+# Token attributes that must be set by the NER model for each profile
+REQUIRED_ATTRS = {
+    "api-minimal": ["ENT_IOB", "POS"],
+    "visualize-full": ["ENT_IOB", "POS", "LEMMA"],
+}
+
+
+def load_pipeline(name: str, profile: str | None = None) -> spacy.language.Language:
+    """Load a spaCy model with the components needed for a profile."""
+    if profile is None:
+        return spacy.load(name)
+    if profile not in PIPELINE_PROFILES:
+        raise ValueError(f"Unknown pipeline profile: {profile}")
+    nlp = spacy.load(name, **PIPELINE_PROFILES[profile])
+    check_pipeline(nlp, REQUIRED_ATTRS[profile])
+    return nlp
+
+
+def check_pipeline(nlp: spacy.language.Language, attrs: list[str]) -> None:
+    """Make sure a model still sets the given token attributes."""
+    doc = nlp("Jane Doe 1, John Smith 2\n1 Department of Biology, Stanford University")
+    missing = [attr for attr in attrs if not doc.has_annotation(attr)]
+    if missing:
+        raise ValueError(
+            f"Pipeline {nlp.meta['name']} with {nlp.pipe_names} doesn't set: "
+            f"{', '.join(missing)}"
+        )
+
+
+def get_preprint_text(openalex_id):
+    """Get the text of a preprint by its OpenAlex ID."""
+    return preprint_corpus[openalex_id]
+
+
+def get_preprint_blocks_path(openalex_id) -> pathlib.Path | None:
+    """Get the path to a preprint's block artifact, if it was extracted with one."""
+    path = blocks_path(PREPRINT_BLOCKS_DIR, openalex_id)
+    return path if path.is_file() else None
+
+
+def read_preprint_metadata(openalex_id):
+    """Get the metadata of a preprint by its OpenAlex ID."""
+    try:
+        metadata = pathlib.Path(f"assets/preprints/json/{openalex_id}.json").read_text(
+            encoding="utf-8"
+        )
+        return json.loads(metadata)
+    except FileNotFoundError:
+        return {}
+
+def get_cocina_affiliations(metadata):
+    """Get the affiliations from a cocina metadata object."""
+    contributors = metadata.get("description", {}).get("contributor", [])
+    if not contributors:
+        return []
+
+    output = {}
+    for contributor in contributors:
+        names = contributor.get("name")
+        if not names:
+            continue
+
+        roles = contributor.get("role")
+        if roles:
+            role_values = [role.get("value") for role in roles]
+            if "author" not in role_values:
+                continue
+
+        for name in names:
+            if values := name.get("structuredValue"):
+                author_name = " ".join([value.get("value") for value in values])
+            if value := name.get("value"):
+                author_name = value
+            output[author_name] = []
+
+        notes = contributor.get("note")
+        if notes:
+            affiliations = [note for note in notes if note["type"] == "affiliation"]
+            for affiliation in affiliations:
+                if structured_value := affiliation.get("structuredValue"):
+                    output[author_name] += [
+                        value["value"] for value in structured_value
+                    ]
+                if value := affiliation.get("value"):
+                    output[author_name].append(value)
+
+    return output
+
+
+def is_affiliation(doc, threshold):
+    """Check the textcat scores for a doc to determine if it contains affiliations."""
+    return (
+        doc.cats.get("AFFILIATION", 0) > threshold
+        or doc.cats.get("AUTHOR", 0) > threshold
+        or like_affiliation(doc)
+    ) and doc.cats.get("CITATION", 0) < 1 - threshold
+
+
+AFFILIATION_LIKE_ENT_LIST = ["ORG", "PERSON", "CARDINAL", "LOC", "GPE"]
+
+
+# TODO: instead of this, retokenize these spans to be larger
+def like_affiliation(doc):
+    """If NER data is available and a Doc consists exclusively of ORG or PERSON entities, it might be an affiliation"""
+    # Check if we have NER data
+    if not doc.ents:
+        return False
+
+    # Check if all entities are "affiliation-like"
+    if not all(ent.label_ in AFFILIATION_LIKE_ENT_LIST for ent in doc.ents):
+        return False
+
+    # Make sure all tokens are either an entity, punctuation, or a digit
+    if not all(
+        token.ent_type_ in AFFILIATION_LIKE_ENT_LIST or token.is_punct or token.is_digit
+        for token in doc
+    ):
+        return False
+
+    # There must be at least one PERSON or ORG entity
+    return any(ent.label_ in ["PERSON", "ORG"] for ent in doc.ents)
+
+
+def get_affiliation_text(
+    text: str,  # The text to search for affiliations
+    nlp: spacy.language.Language,  # The spaCy model to use for text classification
+    threshold: float,  # The minimum probability for a block to be considered an affiliation
+    ner: spacy.language.Language = None,  # The spaCy model to use for NER
+    maybe_threshold: float | None = None,  # Only run NER on blocks scoring this much
+    prefilter=None,  # Cheap model for ruling out blocks before textcat
+) -> str:
+    spans = get_affiliation_spans(
+        text.split("\n"),
+        nlp,
+        threshold,
+        ner=ner,
+        maybe_threshold=maybe_threshold,
+        prefilter=prefilter,
+    )
+    return " ".join([span for span in spans])
+
+
+def get_affiliation_blocks(
+    text: str,  # The text to search for affiliations
+    _nlp: spacy.language.Language,  # The spaCy model to use for text classification
+    threshold: float,  # The minimum probability for a block to be considered an affiliation
+    stats: dict | None = None,  # If given, record how many pages were classified
+) -> list[dict]:
+    """Extract and combine likely affiliation blocks from a given text."""
+    # 1. Analyze pages lazily, so that we stop once the affiliations end
+    pages = text.split("\n\n")
+    page_blocks = analyze_pages((page.split("\n") for page in pages), _nlp, threshold)
+    affiliation_blocks = []
+    pages_classified = 0
+
+    # 2. Move through pages until we identify the first possible affiliation,
+    # and get all affiliations on that page
+    for blocks in page_blocks:
+        pages_classified += 1
+        if any(block["is_affiliation"] for block in blocks):
+            affiliation_blocks += get_affiliation_range(blocks)
+            break
+
+    # 3. Check next page to see if first three blocks have an affiliation
+    if affiliation_blocks:
+        for blocks in page_blocks:
+            pages_classified += 1
+            if not any(block["is_affiliation"] for block in blocks[:3]):
+                break
+            affiliation_blocks += get_affiliation_range(blocks)
+
+    if stats is not None:
+        stats["pages"] = len(pages)
+        stats["pages_classified"] = pages_classified
+
+    # 4. Return all affiliation blocks in order
+    return affiliation_blocks
+
+
+@memoize(
+    key=lambda spans, textcat, threshold, ner, maybe_threshold, prefilter: (
+        text_hash(spans),
+        model_id(textcat),
+        threshold,
+        model_id(ner),
+        maybe_threshold,
+        model_id(prefilter),
+    )
+)
+def get_affiliation_spans(
+    spans: list[str],
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    maybe_threshold: float | None = None,  # Only run NER on blocks scoring this much
+    prefilter=None,  # Cheap model for ruling out blocks before textcat
+) -> list[spacy.tokens.Span]:
+    """Get the predicted affiliation spans in a doc."""
+    return next(
+        get_affiliation_spans_many(
+            [spans], textcat, threshold, ner, maybe_threshold, prefilter=prefilter
+        )
+    )
+
+
+def get_affiliation_spans_many(
+    docs_spans: Iterable[list[str]],  # The spans of each document
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    maybe_threshold: float | None = None,
+    prefilter=None,
+    batch_size: int | None = None,
+    docs_per_chunk: int = 32,
+) -> Iterator[list[str]]:
+    """Get the predicted affiliation spans of many docs in order, batching across docs."""
+    docs_blocks = select_affiliation_blocks_many(
+        docs_spans,
+        textcat,
+        threshold,
+        ner,
+        maybe_threshold,
+        prefilter=prefilter,
+        batch_size=batch_size,
+        docs_per_chunk=docs_per_chunk,
+        with_docs=False,
+    )
+    for blocks in docs_blocks:
+        yield [span for span, _ner_doc in blocks]
+
+
+def select_affiliation_blocks(
+    spans: list[str],
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    maybe_threshold: float | None = None,
+    prefilter=None,
+) -> list[tuple[str, spacy.tokens.Doc | None]]:
+    """Get the predicted affiliation spans in a doc, along with their NER docs."""
+    return next(
+        select_affiliation_blocks_many(
+            [spans], textcat, threshold, ner, maybe_threshold, prefilter=prefilter
+        )
+    )
+
+
+def select_affiliation_blocks_many(
+    docs_spans: Iterable[list[str]],  # The spans of each document
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    maybe_threshold: float | None = None,
+    prefilter=None,
+    batch_size: int | None = None,  # Blocks per batch, in order; by default batched by length
+    docs_per_chunk: int = 32,  # Documents whose blocks are batched together
+    with_docs: bool = True,  # Return the NER doc for each selected span
+) -> Iterator[list[tuple[str, spacy.tokens.Doc | None]]]:
+    """Get the affiliation spans of many docs in order, batching across docs."""
+    for chunk in itertools.batched(docs_spans, docs_per_chunk):
+        # Run textcat over the blocks of every document in the chunk at once,
+        # keeping track of where each document starts and ends
+        spans = [span for doc_spans in chunk for span in doc_spans]
+        bounds = list(itertools.pairwise(itertools.accumulate(map(len, chunk), initial=0)))
+        textcat_docs = list(run_textcat(textcat, spans, batch_size, prefilter))
+        ner_docs = {}
+
+        # If NER is provided, use it to add entities to the docs; in cascade
+        # mode, only the blocks that textcat scores high enough, or that sit
+        # next to an affiliation, are run, judged within each document
+        if ner:
+            candidates = []
+            for start, end in bounds:
+                if maybe_threshold is None:
+                    candidates.extend(range(start, end))
+                else:
+                    doc_candidates = get_ner_candidates(
+                        textcat_docs[start:end], threshold, maybe_threshold
+                    )
+                    candidates.extend(start + i for i in doc_candidates)
+            ner_docs = set_ner_ents(ner, textcat_docs, candidates, batch_size=batch_size)
+
+        # Blocks whose entities came from the cache don't have a NER doc with
+        # tags; rerun just the ones that were selected if the docs are needed
+        selected = [i for i, doc in enumerate(textcat_docs) if is_affiliation(doc, threshold)]
+        if ner and with_docs:
+            rerun = [i for i in selected if i not in ner_docs]
+            ner_pipe = pipe_by_length(ner, [spans[i] for i in rerun], batch_size)
+            ner_docs.update(zip(rerun, ner_pipe))
+
+        # Return all docs that are predicted to be affiliations
+        for start, end in bounds:
+            yield [(spans[i], ner_docs.get(i)) for i in selected if start <= i < end]
+
+
+def select_spancat_blocks_many(
+    texts: Iterable[str],  # The text of each document, pages separated by blank lines
+    spancat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    batch_size: int | None = None,  # Pages per batch; defaults to the model's own
+    docs_per_chunk: int = 32,  # Documents whose pages are batched together
+) -> Iterator[list[tuple[str, spacy.tokens.Doc | None]]]:
+    """Get the affiliation blocks of many docs in order using spancat over pages."""
+    for chunk in itertools.batched(texts, docs_per_chunk):
+        # Run spancat over the pages of every document in the chunk at once
+        pages = [text.split("\n\n") for text in chunk]
+        page_docs = [
+            page_to_doc(spancat, page.split("\n")) for doc_pages in pages for page in doc_pages
+        ]
+        page_scores = get_spancat_scores(spancat, page_docs, batch_size)
+        bounds = itertools.pairwise(itertools.accumulate(map(len, pages), initial=0))
+        docs_spans = [
+            [
+                span
+                for scores in page_scores[start:end]
+                for span in get_spancat_spans(scores, threshold)
+            ]
+            for start, end in bounds
+        ]
+
+        # If NER is provided, run it on the selected blocks of every document
+        if ner:
+            selected = [span for spans in docs_spans for span in spans]
+            ner_docs = iter(pipe_by_length(ner, selected))
+        for spans in docs_spans:
+            yield [(span, next(ner_docs) if ner else None) for span in spans]
+
+
+def page_to_doc(nlp: spacy.language.Language, blocks: list[str]) -> spacy.tokens.Doc:
+    """Make a doc for a page, with a layout span for each of its blocks."""
+    doc = add_layout_spans(nlp.make_doc("\n".join(blocks)))
+    # The suggester only offers layout spans, so spancat can't find anything
+    # on a page without them
+    if not len(doc.spans[LAYOUT_KEY]) and doc.text.strip():
+        warnings.warn(f"No layout spans to suggest on page: {doc.text[:80]!r}")
+    return doc
+
+
+def add_layout_spans(doc: spacy.tokens.Doc) -> spacy.tokens.Doc:
+    """Add a layout span for each block of a doc, one block per line."""
+    spans = []
+    start = 0
+    for block in doc.text.split("\n"):
+        # Blank lines would otherwise expand to the whitespace token around them
+        if block.strip():
+            span = doc.char_span(
+                start, start + len(block), label="text", alignment_mode="expand"
+            )
+            if span is not None and len(span):
+                spans.append(span)
+        start += len(block) + 1
+    doc.spans[LAYOUT_KEY] = spans
+    return doc
+
+
+@spacy.registry.augmenters("layout_spans.v1")
+def create_layout_spans_augmenter() -> Callable:
+    """Give training examples layout spans built the same way as at inference."""
+
+    def augment(nlp: spacy.language.Language, example):
+        add_layout_spans(example.predicted)
+        # The annotated spans were drawn on docling's layout and can stop a
+        # few tokens short of a block here, where they could never match a
+        # suggestion, so label the whole block that each one starts in
+        reference = add_layout_spans(example.reference)
+        blocks = {token.i: span for span in reference.spans[LAYOUT_KEY] for token in span}
+        labelled = {}
+        for span in reference.spans[SPANCAT_KEY]:
+            block = blocks.get(span.start)
+            if block is not None:
+                labelled[(block.start, block.end, span.label_)] = Span(
+                    reference, block.start, block.end, label=span.label_
+                )
+        reference.spans[SPANCAT_KEY] = list(labelled.values())
+        yield example
+
+    return augment
+
+
+def get_spancat_scores(
+    spancat: spacy.language.Language,
+    docs: list[spacy.tokens.Doc],  # Docs with layout spans to suggest
+    batch_size: int | None = None,
+) -> list[list[tuple[str, dict[str, float]]]]:
+    """Score each suggested span of each doc for every label, in order."""
+    # The component only keeps labels that clear its own threshold, which would
+    # hide CITATION scores below it that still rule out an affiliation, so run
+    # the rest of the pipeline and then score the suggestions directly
+    name = next(name for name, pipe in spancat.pipeline if isinstance(pipe, SpanCategorizer))
+    component = spancat.get_pipe(name)
+    ops = component.model.ops
+    docs = list(spancat.pipe(docs, batch_size=batch_size, disable=[name]))
+    results = []
+    for batch in spacy.util.minibatch(docs, batch_size or spancat.batch_size):
+        indices, scores = component.predict(batch)
+        scores = ops.to_numpy(scores)
+        offset = 0
+        for i, doc in enumerate(batch):
+            rows = ops.to_numpy(indices[i].dataXd)
+            # Scores come in the order of the labels, with any negative label last
+            results.append(
+                [
+                    (doc[start:end].text, dict(zip(component.labels, scores[offset + j].tolist())))
+                    for j, (start, end) in enumerate(rows)
+                ]
+            )
+            offset += len(rows)
+    return results
+
+
+def get_spancat_spans(scores: list[tuple[str, dict[str, float]]], threshold: float) -> list[str]:
+    """Get the text of the spans whose scores make them affiliations, in order."""
+    # Judge them the same way as is_affiliation does
+    return [
+        text
+        for text, cats in scores
+        if (cats.get("AFFILIATION", 0) > threshold or cats.get("AUTHOR", 0) > threshold)
+        and cats.get("CITATION", 0) < 1 - threshold
+    ]
+
+
+def get_ner_candidates(
+    docs: list[spacy.tokens.Doc],  # Docs with textcat scores but no entities
+    threshold: float,
+    maybe_threshold: float,
+) -> list[int]:
+    """Get the indices of the docs that are worth running NER on."""
+    # NER can only make a block an affiliation via like_affiliation, which
+    # can't overcome a high CITATION score, so those blocks are always safe
+    # to skip. Of the rest, only blocks that textcat thinks might be
+    # affiliations, or that sit next to a block it is sure about, are kept.
+    # This is an approximation: a low-scoring block that like_affiliation
+    # would have flagged from its entities is no longer selected, so check
+    # the effect with evaluate_extraction.py --check-cascade
+    positive = [is_affiliation(doc, threshold) for doc in docs]
+    candidates = []
+    for i, doc in enumerate(docs):
+        if doc.cats.get("CITATION", 0) >= 1 - threshold:
+            continue
+        if (
+            doc.cats.get("AFFILIATION", 0) > maybe_threshold
+            or doc.cats.get("AUTHOR", 0) > maybe_threshold
+            or any(positive[max(i - 1, 0) : i + 2])
+        ):
+            candidates.append(i)
+    return candidates
+
+
+def get_affiliation_range(blocks: list[dict]) -> list[dict]:
+    """Get the range of blocks between first and last affiliation."""
+    # Get the first and last affiliation blocks
+    all_affiliations = list(filter(lambda block: block["is_affiliation"], blocks))
+    if not all_affiliations:
+        return []
+
+    first_affiliation_block = all_affiliations[0]
+    last_affiliation_block = all_affiliations[-1]
+
+    # Return all blocks between the first and last affiliation
+    return [
+        block
+        for block in blocks
+        if block["index"] >= first_affiliation_block["index"]
+        and block["index"] <= last_affiliation_block["index"]
+    ]
+
+@memoize(
+    key=lambda text, _textcat, threshold, _ner, batch_size, _prefilter: (
+        text_hash(text),
+        model_id(_textcat),
+        threshold,
+        model_id(_ner),
+        model_id(_prefilter),
+    )
+)
+def analyze_blocks(
+    text: str,
+    _textcat: spacy.language.Language,
+    threshold: float,
+    _ner: spacy.language.Language = None,
+    batch_size: int | None = None,  # Blocks per batch, in order; by default batched by length
+    _prefilter=None,  # Cheap model for ruling out blocks before textcat
+) -> list[list[dict]]:
+    pages = text.split("\n\n")
+    blocks = [page.split("\n") for page in pages]
+    return analyze_all_pages(
+        blocks, _textcat, threshold, _ner, batch_size=batch_size, prefilter=_prefilter
+    )
+
+
+def analyze_all_pages(
+    pages: list[list[str]],  # The blocks on each page
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    batch_size: int | None = None,
+    prefilter=None,
+) -> list[list[dict]]:
+    """Analyze the blocks on every page, batching across pages."""
+    # Run the models over all blocks at once so that they can be batched, then
+    # put the results back into pages
+    blocks = [block for page in pages for block in page]
+    results = classify_blocks(
+        blocks, textcat, threshold, ner, batch_size=batch_size, prefilter=prefilter
+    )
+    return [
+        [{"index": block, "page": page, **next(results)} for block in range(len(page_blocks))]
+        for page, page_blocks in enumerate(pages)
+    ]
+
+
+def analyze_pages(
+    pages: Iterable[list[str]],  # The blocks on each page, e.g. from iter_clean_pages
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    batch_size: int | None = None,
+    prefilter=None,
+) -> Iterator[list[dict]]:
+    """Analyze the blocks on each page, yielding results as each page is done."""
+    for page, blocks in enumerate(pages):
+        results = classify_blocks(
+            blocks, textcat, threshold, ner, batch_size=batch_size, prefilter=prefilter
+        )
+        yield [
+            {"index": block, "page": page, **result}
+            for block, result in enumerate(results)
+        ]
+
+
+def classify_blocks(
+    blocks: list[str],
+    textcat: spacy.language.Language,
+    threshold: float,
+    ner: spacy.language.Language = None,
+    batch_size: int | None = None,
+    prefilter=None,
+) -> Iterator[dict]:
+    """Run the models over a list of blocks in batches, yielding their analysis."""
+    block_docs = list(run_textcat(textcat, blocks, batch_size=batch_size, prefilter=prefilter))
+
+    # If NER is provided, use it to add entities to the docs
+    if ner:
+        set_ner_ents(ner, block_docs, batch_size=batch_size)
+
+    for block_doc in block_docs:
+        yield {
+            "text": block_doc.text,
+            "is_affiliation": is_affiliation(block_doc, threshold),
+            "like_affiliation": like_affiliation(block_doc),
+            "cats": block_doc.cats,
+        }
+
+
+def run_textcat(
+    textcat: spacy.language.Language,
+    texts: list[str],
+    batch_size: int | None = None,
+    prefilter=None,  # Anything with a keep(texts) method, e.g. a BlockPrefilter
+) -> Iterator[spacy.tokens.Doc]:
+    """Run textcat over texts, except for those that a prefilter rules out."""
+    # Blocks that are ruled out get zero for every label without running
+    # textcat, and blocks that were seen before get their stored scores
+    keep = prefilter.keep(texts) if prefilter else [True] * len(texts)
+    labels = get_textcat_labels(textcat)
+    cache = prediction_cache
+    # One pipeline can do both textcat and NER, so keep their entries apart
+    model = f"{model_id(textcat)}:cats" if cache else None
+    cached = [
+        cache.get(model, text) if cache and kept else None
+        for text, kept in zip(texts, keep)
+    ]
+    run = [kept and hit is None for kept, hit in zip(keep, cached)]
+    run_docs = iter(
+        pipe_by_length(
+            textcat, [text for text, needed in zip(texts, run) if needed], batch_size
+        )
+    )
+    new_predictions = []
+    for text, kept, hit, needed in zip(texts, keep, cached, run):
+        doc = next(run_docs) if needed else textcat.make_doc(text)
+        # Models only score empty docs as zero when they aren't batched with
+        # any other docs, so do it here to get the same results either way
+        if not kept or not len(doc):
+            doc.cats = dict.fromkeys(labels, 0.0)
+        elif hit is not None:
+            doc.cats = hit["cats"]
+        if cache and needed:
+            new_predictions.append((text, {"cats": doc.cats}))
+        yield doc
+    if cache:
+        cache.put_many(model, new_predictions)
+
+
+def set_ner_ents(
+    ner: spacy.language.Language,
+    docs: list[spacy.tokens.Doc],
+    indices: Iterable[int] | None = None,  # Only add entities to these docs
+    batch_size: int | None = None,
+) -> dict[int, spacy.tokens.Doc]:
+    """Add NER entities to docs, returning the NER docs for those not cached."""
+    indices = range(len(docs)) if indices is None else indices
+    cache = prediction_cache
+    model = f"{model_id(ner)}:ents" if cache else None
+    missed = []
+    for i in indices:
+        hit = cache.get(model, docs[i].text) if cache else None
+        if hit is None:
+            missed.append(i)
+        else:
+            set_ents_from_offsets(docs[i], hit["ents"])
+
+    ner_docs = {}
+    ner_pipe = pipe_by_length(ner, [docs[i].text for i in missed], batch_size)
+    for i, ner_doc in zip(missed, ner_pipe):
+        copy_ents(ner_doc, docs[i])
+        ner_docs[i] = ner_doc
+    if cache:
+        cache.put_many(
+            model,
+            [
+                (doc.text, {"ents": [[e.start_char, e.end_char, e.label_] for e in doc.ents]})
+                for doc in ner_docs.values()
+            ],
+        )
+    return ner_docs
+
+
+def set_ents_from_offsets(doc: spacy.tokens.Doc, ents: list[list]) -> None:
+    """Set entities on a doc from (start char, end char, label) triples."""
+    spans = [doc.char_span(start, end, label=label) for start, end, label in ents]
+    doc.set_ents([span for span in spans if span is not None])
+
+
+class TieredTextcat:
+    """
+    Textcat that scores blocks with a fast model, and only passes the blocks it
+    is unsure about to an accurate model. Can be used in place of a pipeline
+    wherever blocks are classified.
+    """
+
+    def __init__(
+        self,
+        fast: spacy.language.Language,  # e.g. the tok2vec textcat
+        accurate: spacy.language.Language,  # e.g. the transformer textcat
+        threshold: float = 0.75,  # The threshold for is_affiliation
+        band: float = 0.25,  # Share of the way from a threshold to 0 or 1 that is uncertain
+    ):
+        self.fast = fast
+        self.accurate = accurate
+        self.threshold = threshold
+        self.band = band
+        self.blocks = 0
+        self.escalated = 0
+
+    @property
+    def model_id(self) -> str:
+        return (
+            f"tiered-{model_id(self.fast)}-{model_id(self.accurate)}"
+            f"-{self.threshold}-{self.band}"
+        )
+
+    @property
+    def pipeline(self) -> list:
+        # Scores always have the accurate model's labels
+        return self.accurate.pipeline
+
+    def make_doc(self, text: str) -> spacy.tokens.Doc:
+        return self.fast.make_doc(text)
+
+    def is_uncertain(self, doc: spacy.tokens.Doc) -> bool:
+        """Check whether any score that is_affiliation uses is near its own threshold."""
+        thresholds = {
+            "AFFILIATION": self.threshold,
+            "AUTHOR": self.threshold,
+            "CITATION": 1 - self.threshold,
+        }
+        for label, threshold in thresholds.items():
+            score = doc.cats.get(label)
+            if score is None:
+                continue
+            # The band is a share of the way from the threshold down to 0 or up
+            # to 1, so a threshold near either end doesn't take in every score
+            # on that side, like CITATION's does at 1 - 0.75
+            width = threshold if score < threshold else 1 - threshold
+            if abs(score - threshold) <= self.band * width:
+                return True
+        return False
+
+    def pipe(
+        self, texts: Iterable[str], batch_size: int | None = None
+    ) -> Iterator[spacy.tokens.Doc]:
+        """Score texts with the fast model, then rescore uncertain ones accurately."""
+        docs = pipe_by_length(self.fast, list(texts), batch_size)
+        uncertain = [i for i, doc in enumerate(docs) if len(doc) and self.is_uncertain(doc)]
+        accurate_docs = pipe_by_length(self.accurate, [docs[i].text for i in uncertain], batch_size)
+        for i, doc in zip(uncertain, accurate_docs):
+            docs[i] = doc
+        self.blocks += len(docs)
+        self.escalated += len(uncertain)
+        yield from docs
+
+    def stats(self) -> dict:
+        return {
+            "blocks": self.blocks,
+            "escalated": self.escalated,
+            "escalated_share": round(self.escalated / self.blocks, 4) if self.blocks else 0.0,
+        }
+
+
+def get_textcat_labels(textcat: spacy.language.Language) -> list[str]:
+    """Get the labels predicted by the text classifiers in a pipeline."""
+    return [
+        label
+        for _name, pipe in textcat.pipeline
+        if isinstance(pipe, TextCategorizer)
+        for label in pipe.labels
+    ]
+
+
+@memoize(
+    key=lambda path, _textcat, threshold, _ner, batch_size, _prefilter: (
+        # Artifacts are rewritten when their PDF is re-extracted
+        str(path),
+        path.stat().st_mtime_ns,
+        path.stat().st_size,
+        model_id(_textcat),
+        threshold,
+        model_id(_ner),
+        model_id(_prefilter),
+    )
+)
+def analyze_blocks_artifact(
+    path: pathlib.Path,
+    _textcat: spacy.language.Language,
+    threshold: float,
+    _ner: spacy.language.Language = None,
+    batch_size: int | None = None,
+    _prefilter=None,
+) -> list[list[dict]]:
+    """Analyze the blocks stored in a block artifact, adding their layout."""
+    from clean_preprints_pymupdf import normalize_block
+
+    # Blocks are cleaned the same way as for the text files, which drops some
+    # of them, so keep track of the record each remaining block came from
+    pages = []
+    records = []
+    for page in read_blocks(path):
+        page_blocks = []
+        page_records = []
+        for record in page:
+            block = normalize_block(record_to_block(record))
+            if block:
+                page_blocks.append(block)
+                page_records.append(record)
+        pages.append(page_blocks)
+        records.append(page_records)
+
+    analyzed = analyze_all_pages(
+        pages, _textcat, threshold, _ner, batch_size=batch_size, prefilter=_prefilter
+    )
+    for page, page_records in zip(analyzed, records):
+        for block, record in zip(page, page_records):
+            block.update(block_layout(record))
+    return analyzed
+
+
+def pipe_by_length(
+    nlp: spacy.language.Language,
+    texts: list[str],
+    batch_size: int | None = None,  # Run in document order, this many at a time
+) -> list[spacy.tokens.Doc]:
+    """Run a pipeline over texts in batches of similar length, keeping their order."""
+    # Tiered models batch each of their tiers themselves
+    if isinstance(nlp, TieredTextcat):
+        return list(nlp.pipe(texts, batch_size=batch_size))
+    max_tokens = get_batch_tokens()
+    if batch_size is not None or not max_tokens:
+        return list(nlp.pipe(texts, batch_size=batch_size))
+
+    # Tokenize first to get the lengths; the pipeline reuses these docs
+    docs = [nlp.make_doc(text) for text in texts]
+    order = sorted(range(len(docs)), key=lambda i: len(docs[i]))
+    results = [None] * len(docs)
+    for batch in length_batches([len(docs[i]) for i in order], max_tokens):
+        indices = [order[i] for i in batch]
+        batch_docs = nlp.pipe([docs[i] for i in indices], batch_size=len(indices))
+        for i, doc in zip(indices, batch_docs):
+            results[i] = doc
+    return results
+
+
+def length_batches(lengths: list[int], max_tokens: int) -> Iterator[list[int]]:
+    """Split sorted lengths into batches whose padded size is at most max_tokens."""
+    # Every item in a batch is padded to the length of the longest, which is
+    # the last one since they're sorted; a single long item gets its own batch
+    batch = []
+    for i, length in enumerate(lengths):
+        if batch and (len(batch) + 1) * max(length, 1) > max_tokens:
+            yield batch
+            batch = []
+        batch.append(i)
+    if batch:
+        yield batch
+
+
+def get_batch_tokens() -> int:
+    """Get the current token budget for a batch, sizing it now if it's "auto"."""
+    tokens = parse_batch_tokens(batch_tokens)
+    if tokens != "auto":
+        return tokens
+    available = available_memory()
+    if available is None:
+        return DEFAULT_BATCH_TOKENS
+    budget = int(available * AUTO_MEMORY_SHARE / BYTES_PER_TOKEN)
+    return max(MIN_BATCH_TOKENS, min(MAX_BATCH_TOKENS, budget))
+
+
+def available_memory() -> int | None:
+    """Get the memory available to new allocations in bytes, where Linux reports it."""
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def parse_batch_tokens(value: int | str) -> int | str:
+    """Check a batch token budget: a number of tokens, "auto", or 0."""
+    if isinstance(value, str) and value.strip().lower() == "auto":
+        return "auto"
+    try:
+        tokens = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'Batch tokens must be a whole number or "auto", not {value!r}')
+    if tokens < 0:
+        raise ValueError(f"Batch tokens can't be negative, not {tokens}")
+    return tokens
+
+
+def set_batch_tokens(tokens: int | str) -> None:
+    """Batch blocks by length up to this many tokens, "auto", or 0 to stop."""
+    global batch_tokens
+    batch_tokens = parse_batch_tokens(tokens)
+
+
+def set_prediction_cache(cache: BlockPredictionCache | None) -> None:
+    """Store and reuse block predictions in a cache, or stop if None."""
+    global prediction_cache
+    prediction_cache = cache
+
+
+def copy_ents(source: spacy.tokens.Doc, target: spacy.tokens.Doc) -> None:
+    """Set the entities of one doc on another doc with the same tokenization."""
+    ents = []
+    for ent in source.ents:
+        span = Span(target, start=ent.start, end=ent.end, label=ent.label_)
+        ents.append(span)
+    target.set_ents(ents)
+
+
+# Define the pattern for matching affiliation keys
+KEY_PATTERN = r"^[a-z*†‡§¶#]$|^\d{1,3}$"
+KEYS_PATTERN = [
+    {"TEXT": {"REGEX": KEY_PATTERN}, "ENT_TYPE": "", "OP": "+"},
+]
+
+
+def set_affiliation_ents(nlp, doc):
+    """
+    Filter entities to only include those that are relevant for affiliations,
+    and add affiliation keys.
+    """
+    # Drop unused ent categories
+    new_ents = [ent for ent in doc.ents if ent.label_ in ["PERSON", "ORG", "GPE"]]
+    doc.ents = new_ents
+
+    # If any entities might include a key at the beginning, adjust their start
+    new_ents = doc.ents
+    for ent in new_ents:
+        if ent.start > 0 and re.match(KEY_PATTERN, doc[ent.start].text):
+            ent.start += 1
+    doc.ents = new_ents
+
+    # Add affiliation keys
+    add_affiliation_keys(nlp, doc)
+
+    # Return the modified doc
+    return doc
+
+
+def get_affiliation_keys(nlp, doc):
+    """
+    Return tokens in a doc that match the affiliation key pattern.
+    Expects to have been run after the NER component.
+    """
+    from spacy.matcher import Matcher
+
+    matcher = Matcher(nlp.vocab)
+    matcher.add("KEYS", [KEYS_PATTERN])
+    matches = matcher(doc)
+
+    # Create a text:tokens mapping of potential keys
+    key_map = defaultdict(list)
+    for _id, start, end in matches:
+        if len(doc[start:end]) == 1:
+            token = doc[start]
+            key_map[token.text].append(token)
+
+    # Keep only keys that occur at least twice
+    keys = []
+    for _key_text, tokens in key_map.items():
+        if len(tokens) >= 2:
+            keys.extend(tokens)
+
+    # Drop keys that are the wrong part of speech (e.g. determiner "a")
+    keys = [key for key in keys if key.pos_ in ["NUM", "NOUN", "PROPN", "PUNCT"]]
+
+    return keys
+
+
+def add_affiliation_keys(nlp, doc):
+    """
+    Adds affiliation keys to a spaCy doc.
+    Expects to have been run after the NER component.
+    """
+    keys = get_affiliation_keys(nlp, doc)
+    for key in keys:
+        span = Span(doc, key.i, key.i + 1, label="KEY")
+        try:
+            doc.ents = list(doc.ents) + [span]
+        except ValueError:  # potential key already part of a different entity
+            pass
+
+
+class NonKeyedAffiliationParser:
+    """Parser for affiliations where each author is followed by their affiliation."""
+
+    _graph: nx.DiGraph
+    _current_person: Span
+    _current_affiliation: list[Span]
+
+    def parse_doc(self, doc):
+        """Parse a spaCy doc for affiliations."""
+        import networkx as nx
+
+        self._graph = nx.DiGraph()
+        self._current_person = None
+        self._current_affiliation = []
+        for previous_ent, current_ent in zip(doc.ents, doc.ents[1:]):
+            self._process_ent(current_ent, previous_ent)
+        return self._graph
+
+    def _process_ent(self, current_ent, previous_ent):
+        # call more specific function based on ent type, if any
+        match current_ent.label_:
+            case "PERSON":
+                self._process_person(current_ent, previous_ent)
+            case "ORG":
+                self._process_org(current_ent, previous_ent)
+            case "GPE":
+                self._process_gpe(current_ent, previous_ent)
+
+    def _process_person(self, person, _previous_ent):
+        # emit nodes for the person and affiliation and connect them
+        if self._current_affiliation and self._current_person:
+            self._emit_relationship(self._current_person, self._current_affiliation)
+            self._current_affiliation = []
+        self._current_person = person
+
+    def _process_org(self, affiliation, previous_ent):
+        # add the org to the current affiliation
+        if self._current_person:
+            if previous_ent.label_ == "ORG":
+                self._current_affiliation.append(affiliation)
+
+    def _process_gpe(self, gpe, _previous_ent):
+        # add the gpe to the current affiliation
+        if self._current_person:
+            if self._current_affiliation:
+                self._current_affiliation.append(gpe)
+
+    def _emit_relationship(self, person, affiliation):
+        person_node = self._emit_person(person)
+        affiliation_head_node = self._emit_affiliation(affiliation)
+        self._graph.add_edge(person_node, affiliation_head_node, type="affiliated with")
+
+    def _emit_person(self, person):
+        self._graph.add_node(
+            person.text,
+            label=person.text,
+            span=person,
+            type="person",
+        )
+        return person.text
+
+    def _emit_affiliation(self, affiliation):
+        last_node = None
+        last_node_type = None
+
+        # Create nodes for each part of the affiliation
+        for i in range(1, len(affiliation) + 1):
+            parts = affiliation[-i:]
+            node_id = ", ".join([part.text for part in parts])
+            if node_id not in self._graph:
+                self._graph.add_node(
+                    node_id,
+                    label=parts[0].text,
+                    span=affiliation,
+                    type=parts[0].label_.lower(),
+                )
+            if last_node:
+                if last_node_type == "ORG" and parts[0].label_ == "ORG":
+                    self._graph.add_edge(node_id, last_node, type="part of")
+                else:
+                    self._graph.add_edge(node_id, last_node, type="located in")
+            last_node = node_id
+            last_node_type = parts[0].label_
+
+        # Return the last node created (most specific)
+        return last_node
+
+
+class KeyedAffiliationParser:
+    """Parser for affiliations where keys link authors to affiliations."""
+
+    _graph: nx.DiGraph
+    _keys: dict[list[Span]]
+
+    def parse_doc(self, doc):
+        """Parse a spaCy doc for affiliations."""
+        import networkx as nx
+
+        self._graph = nx.DiGraph()
+        self._keys = {
+            key: [] for key in [t.text for t in doc.ents if t.label_ == "KEY"]
+        }
+        self._org_keys = {}
+        self._parse_affiliations(doc)
+        self._parse_authors(doc)
+        self._emit_relationships()
+        return self._graph
+
+    def _get_first_affiliation_index(self, doc) -> int:
+        """Get the point in the doc where authors end and affiliations start."""
+        # Heuristic: each org has exactly one key preceding it
+        # Find the first org in the doc, back up one token, and return that index
+        for ent in doc.ents:
+            if ent.label_ == "ORG":
+                return ent.start - 1
+        raise ValueError("No affiliations found in document.")
+
+    def _emit_relationships(self) -> None:
+        """Create relationships between authors and affiliations."""
+        for key, contents in self._keys.items():
+            org = self._org_keys.get(key)
+            if org:
+                for person in contents:
+                    self._graph.add_edge(person.text, org, type="affiliated with")
+
+    def _parse_authors(self, doc) -> None:
+        """Parse the authors in the document."""
+        end = self._get_first_affiliation_index(doc)
+        current_person = None
+        for ent in doc.ents:
+            if ent.start >= end:
+                break
+            if ent.label_ == "PERSON":
+                if ent.text not in self._graph:
+                    self._graph.add_node(
+                        ent.text,
+                        label=ent.text,
+                        span=ent,
+                        type="person",
+                    )
+                current_person = ent
+            if ent.label_ == "KEY":
+                if current_person:
+                    self._keys[ent.text].append(current_person)
+
+    def _parse_affiliations(self, doc) -> None:
+        """Parse the affiliations in the document."""
+        start = self._get_first_affiliation_index(doc)
+        current_key = None
+        current_affiliation = []
+        for previous_ent, current_ent in zip(doc.ents, doc.ents[1:]):
+            if current_ent.start < start:
+                continue
+            match current_ent.label_:
+                case "PERSON":
+                    if current_key and current_affiliation:
+                        self._emit_affiliation(current_key, current_affiliation)
+                    current_key = None
+                    current_affiliation = []
+                case "KEY":
+                    if current_key and current_affiliation:
+                        self._emit_affiliation(current_key, current_affiliation)
+                    current_key = current_ent.text
+                    current_affiliation = []
+                case "ORG":
+                    if previous_ent.label_ in ["KEY", "ORG"]:
+                        current_affiliation.append(current_ent)
+                case "GPE":
+                    if previous_ent.label_ in ["ORG", "GPE"]:
+                        current_affiliation.append(current_ent)
+        if current_key and current_affiliation:
+            self._emit_affiliation(current_key, current_affiliation)
+
+    def _emit_affiliation(self, key, affiliation):
+        last_node = None
+        last_node_type = None
+
+        # Create nodes for each part of the affiliation
+        for i in range(1, len(affiliation) + 1):
+            parts = affiliation[-i:]
+            node_id = ", ".join([part.text for part in parts])
+            if node_id not in self._graph:
+                self._graph.add_node(
+                    node_id,
+                    label=parts[0].text,
+                    span=affiliation,
+                    type=parts[0].label_.lower(),
+                )
+            if last_node:
+                if last_node_type == "ORG" and parts[0].label_ == "ORG":
+                    self._graph.add_edge(node_id, last_node, type="part of")
+                else:
+                    self._graph.add_edge(node_id, last_node, type="located in")
+            last_node = node_id
+            last_node_type = parts[0].label_
+
+        # Return the last node created (most specific)
+        self._org_keys[key] = last_node
+        return last_node
+
+
+def get_affiliation_graph(doc) -> nx.graph:
+    """Create a graph from the affiliations in a doc."""
+    if any(ent.label_ == "KEY" for ent in doc.ents):
+        parser = KeyedAffiliationParser()
+    else:
+        parser = NonKeyedAffiliationParser()
+    return parser.parse_doc(doc)
+    # TODO: prune any nodes without edges?
+
+
+def get_affiliation_dict(graph: nx.graph) -> dict[str, list[str]]:
+    """Get a dictionary of authors and their affiliations from a graph."""
+    affiliations = {}
+    for node in graph.nodes(data=True):
+        if node[1]["type"] == "person":
+            author = node[1]["label"]
+            if author not in affiliations:
+                affiliations[author] = []
+            for edge in graph.edges(node[0], data=True):
+                if edge[2]["type"] == "affiliated with":
+                    affiliation = edge[1]
+                    affiliations[author].append(affiliation)
+    return affiliations
+
+
+# Helper to run the entire processing pipeline on a text string
+def analyze_pdf_text(
+    text, textcat, ner, threshold=0.75, maybe_threshold=None, prefilter=None
+) -> nx.Graph:
+    return next(
+        analyze_many([text], textcat, ner, threshold, maybe_threshold, prefilter=prefilter)
+    )
+
+
+def analyze_many(
+    texts_or_paths: Iterable[str | pathlib.Path],  # Texts, or paths to .txt or .pdf files
+    textcat: spacy.language.Language,
+    ner: spacy.language.Language,
+    threshold: float = 0.75,
+    maybe_threshold: float | None = None,  # Only run NER on blocks scoring this much
+    prefilter=None,  # Cheap model for ruling out blocks before textcat
+    batch_size: int | None = None,  # Blocks per batch, in order; by default batched by length
+    docs_per_chunk: int = 32,  # Documents whose blocks are batched together
+    max_pages: int | None = None,  # Only extract this many pages from PDFs
+) -> Iterator[nx.Graph]:
+    """Run the entire pipeline on many documents, yielding their graphs in order."""
+    texts = (read_document(text_or_path, max_pages) for text_or_path in texts_or_paths)
+    docs_blocks = select_affiliation_blocks_many(
+        (text.split("\n") for text in texts),
+        textcat,
+        threshold,
+        ner=ner,
+        maybe_threshold=maybe_threshold,
+        prefilter=prefilter,
+        batch_size=batch_size,
+        docs_per_chunk=docs_per_chunk,
+    )
+    for blocks in docs_blocks:
+        # NER already ran on each selected block, so combine those docs rather
+        # than running NER again on the joined affiliation text
+        doc = merge_docs(ner, [ner_doc for _span, ner_doc in blocks])
+        doc = set_affiliation_ents(ner, doc)
+        yield get_affiliation_graph(doc)
+
+
+def read_document(text_or_path: str | pathlib.Path, max_pages: int | None = None) -> str:
+    """Get the text of a document given as text, or as a path to a text or PDF file."""
+    if not isinstance(text_or_path, pathlib.Path):
+        return text_or_path
+    if text_or_path.suffix.lower() == ".pdf":
+        from clean_preprints_pymupdf import pdf_path_to_struct, text_from_struct
+
+        return text_from_struct(pdf_path_to_struct(text_or_path, max_pages=max_pages, flat=True))
+    return text_or_path.read_text(encoding="utf-8")
+
+
+def merge_docs(nlp: spacy.language.Language, docs: list[spacy.tokens.Doc]) -> spacy.tokens.Doc:
+    """Join docs into one, separated by spaces, keeping their tags and entities."""
+    if not docs:
+        return nlp.make_doc("")
+    # Extension data like transformer outputs can't be combined, and isn't needed
+    return Doc.from_docs(docs, ensure_whitespace=True, exclude=["tensor", "user_data"])
+
+
+def lev_ratio_list(list_a, list_b):
+    """Calculate the averaged levenshtein ratio between two lists of strings."""
+    from Levenshtein import ratio
+
+    max_len = max(len(list_a), len(list_b))
+    levs = []
+    for i in range(max_len):
+        item_a = list_a[i] if i < len(list_a) else ""
+        item_b = list_b[i] if i < len(list_b) else ""
+        levs.append(ratio(item_a, item_b))
+    return sum(levs) / len(levs) if levs else 0.0
+
+
+def lev_ratio_combined_list(list_a, list_b):
+    """Calculate the levenshtein ratio between two lists of strings."""
+    from Levenshtein import ratio
+
+    return ratio(" ".join(list_a), " ".join(list_b))
@@ -0,0 +1,57 @@
+import pathlib
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Iterator
+
+
+class PreprintCorpus(Mapping):
+    """Preprint texts by OpenAlex ID, read from disk only when they're needed."""
+
+    def __init__(
+        self,
+        path: pathlib.Path,  # Directory of <openalex_id>.txt files
+        max_cached: int = 256,  # Number of texts to keep in memory
+    ):
+        self.path = pathlib.Path(path)
+        self.max_cached = max_cached
+        self._ids = None
+        self._texts = OrderedDict()
+
+    @property
+    def ids(self) -> list[str]:
+        """The IDs of all preprints, listed once without reading any files."""
+        if self._ids is None:
+            self._ids = sorted(file.stem for file in self.path.glob("*.txt"))
+        return self._ids
+
+    def refresh(self) -> None:
+        """Forget the listed IDs and cached texts, e.g. after adding preprints."""
+        self._ids = None
+        self._texts.clear()
+
+    def read(self, openalex_id: str) -> str:
+        """Read a preprint's text from disk, bypassing the cache."""
+        return (self.path / f"{openalex_id}.txt").read_text(encoding="utf-8")
+
+    def __getitem__(self, openalex_id: str) -> str:
+        if openalex_id in self._texts:
+            self._texts.move_to_end(openalex_id)
+            return self._texts[openalex_id]
+        try:
+            text = self.read(openalex_id)
+        except FileNotFoundError:
+            raise KeyError(openalex_id) from None
+        if self.max_cached > 0:
+            self._texts[openalex_id] = text
+            while len(self._texts) > self.max_cached:
+                self._texts.popitem(last=False)
+        return text
+
+    def __contains__(self, openalex_id) -> bool:
+        return openalex_id in self._texts or (self.path / f"{openalex_id}.txt").is_file()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.ids)
@@ -5,9 +5,9 @@ import pathlib
 import jsonlines
 import spacy
 import typer
+from core import all_preprints, get_affiliation_spans_many
 from rich import print
 from rich.progress import track
-from utils import all_preprints, get_affiliation_text
 
 
 def main(
@@ -27,13 +27,20 @@ def main(
     print(
         f"Keeping blocks with >{threshold} affiliation probability."
     )
+    # Blocks from many preprints are classified together in shared batches
+    openalex_ids = list(all_preprints.keys())
+    docs_spans = get_affiliation_spans_many(
+        (text.split("\n") for text in all_preprints.values()), nlp, threshold
+    )
     with jsonlines.open(output_file.resolve(), mode="w") as writer:
-        for openalex_id, text in track(
-            all_preprints.items(), description="Creating dataset..."
+        for openalex_id, spans in track(
+            zip(openalex_ids, docs_spans),
+            description="Creating dataset...",
+            total=len(openalex_ids),
         ):
             writer.write(
                 {
-                    "text": "\n".join(get_affiliation_text(text, nlp, threshold)),
+                    "text": "\n".join(spans),
                     "meta": {
                         "openalex_id": openalex_id,
                     },
@@ -5,10 +5,10 @@ import pathlib
 import jsonlines
 import spacy
 import typer
+from core import all_openalex_ids
 from rich import print
 from rich.progress import track
 from spacy_layout import spaCyLayout
-from utils import all_openalex_ids
 
 
 def not_text(span: spacy.tokens.Span) -> bool:
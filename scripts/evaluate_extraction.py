@@ -17,7 +17,11 @@ root = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
 PROJECT_ROOT = Path(root)
 sys.path.insert(1, str(PROJECT_ROOT / "scripts"))
 
-from utils import get_affiliation_spans, get_cocina_affiliations  # noqa: E402
+from core import (  # noqa: E402
+    get_affiliation_spans_many,
+    get_cocina_affiliations,
+    load_pipeline,
+)
 
 # Preprints that we want to focus on
 PROBLEM_LIST = [
@@ -99,6 +103,8 @@ def main(
     preprints_path: Path = Path("assets/preprints/txt"),
     metrics_path: Path = Path("metrics"),
     threshold: float = 0.5,
+    maybe_threshold: float | None = None,  # Only run NER on blocks scoring this much
+    check_cascade: bool = False,  # Check the cascade against running NER on every block
 ) -> None:
     """Evaluate the affiliation extraction process against ground truth text files."""
     # Load all the ground truth files
@@ -110,15 +116,48 @@ def main(
     # Set up the extraction model
     spacy.prefer_gpu()
     textcat = spacy.load("training/textcat_multilabel/model-best")
-    ner = spacy.load("en_core_web_trf")
-
-    # For each preprint in the problem list, get the predicted affiliation text
-    pred_texts = {}
-    for preprint_id in PROBLEM_LIST:
-        preprint_txt = (preprints_path / f"{preprint_id}.txt").read_text("utf-8")
-        pred_texts[preprint_id] = " ".join(
-            get_affiliation_spans(preprint_txt.splitlines(), textcat, threshold, ner=ner)
+    ner = load_pipeline("en_core_web_trf", "api-minimal")
+
+    # For each preprint in the problem list, get the predicted affiliation text;
+    # blocks from all preprints are classified together in shared batches
+    preprint_lines = [
+        (preprints_path / f"{preprint_id}.txt").read_text("utf-8").splitlines()
+        for preprint_id in PROBLEM_LIST
+    ]
+    pred_spans = dict(
+        zip(
+            PROBLEM_LIST,
+            get_affiliation_spans_many(
+                preprint_lines,
+                textcat,
+                threshold,
+                ner=ner,
+                maybe_threshold=maybe_threshold,
+            ),
         )
+    )
+    pred_texts = {
+        preprint_id: " ".join(spans) for preprint_id, spans in pred_spans.items()
+    }
+
+    # The cascade can drop blocks that only NER would have flagged, so compare
+    # it with running NER on every block
+    mismatches = []
+    if check_cascade and maybe_threshold is not None:
+        full_spans = get_affiliation_spans_many(preprint_lines, textcat, threshold, ner=ner)
+        for preprint_id, spans in zip(PROBLEM_LIST, full_spans):
+            if pred_spans[preprint_id] != spans:
+                mismatches.append(preprint_id)
+
+    console = Console()
+    if check_cascade and maybe_threshold is not None:
+        if mismatches:
+            console.print(
+                f"[bold red]Cascade changed the selected blocks for "
+                f"{len(mismatches)} preprints: {', '.join(mismatches)}[/bold red]"
+            )
+        else:
+            console.print("[bold green]Cascade selected the same blocks as the full run[/bold green]")
 
     # Compute the scores and averages
     scores = {
@@ -132,6 +171,8 @@ def main(
         "median": median_score,
         "scores": scores,
     }
+    if check_cascade and maybe_threshold is not None:
+        metrics["cascade"] = {"maybe_threshold": maybe_threshold, "changed": mismatches}
 
     # Load last run and best run metrics if present
     last_run = metrics_path / "extraction-last.json"
@@ -150,7 +191,6 @@ def main(
 
     # Print overall mean score
     # If the current mean score is better than the best, save it
-    console = Console()
     if mean_score > best_metrics["mean"]:
         best_run.write_text(json.dumps(metrics, indent=2))
         console.print(f"[bold green]New best mean: {mean_score}[/bold green]")
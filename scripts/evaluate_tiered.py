@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+import json
+import pathlib
+import time
+
+import spacy
+import typer
+from core import TieredTextcat, get_textcat_labels, is_affiliation, pipe_by_length
+from prefilter import read_corpus
+from rich import print
+from rich.table import Table
+from spacy.tokens import DocBin
+
+
+def decision_scores(predicted: list[bool], expected: list[bool]) -> dict:
+    """Compare affiliation decisions with the expected ones."""
+    tp = sum(p and e for p, e in zip(predicted, expected))
+    fp = sum(p and not e for p, e in zip(predicted, expected))
+    fn = sum(e and not p for p, e in zip(predicted, expected))
+    return {
+        "accuracy": round(
+            sum(p == e for p, e in zip(predicted, expected)) / max(len(expected), 1), 4
+        ),
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+    }
+
+
+def main(
+    fast_model: pathlib.Path = pathlib.Path("training/textcat_tok2vec/model-best"),
+    accurate_model: pathlib.Path = pathlib.Path("training/textcat/model-best"),
+    dev_path: pathlib.Path = pathlib.Path("corpus/textcat/dev.spacy"),  # Dev set the models were trained for
+    metrics_path: pathlib.Path = pathlib.Path("metrics/tiered-textcat.json"),
+    threshold: float = 0.75,  # The threshold for is_affiliation, as in the API
+    band: list[float] = [0.1, 0.25, 0.4],  # Uncertainty bands to try; repeat to choose
+) -> None:
+    """Compare a tiered textcat with the fast and accurate models on their own."""
+    fast = spacy.load(fast_model)
+    accurate = spacy.load(accurate_model)
+
+    # The binary and multilabel corpora label blocks differently, so only
+    # compare against the one with the same labels as the models
+    dev_labels = {
+        label for doc in DocBin().from_disk(dev_path).get_docs(fast.vocab) for label in doc.cats
+    }
+    for path, nlp in [(fast_model, fast), (accurate_model, accurate)]:
+        if set(get_textcat_labels(nlp)) != dev_labels:
+            raise typer.BadParameter(
+                f"{path} predicts {sorted(get_textcat_labels(nlp))}, but {dev_path} "
+                f"is labelled with {sorted(dev_labels)}",
+                param_hint="--dev-path",
+            )
+    texts, labels = read_corpus([dev_path])
+    print(f"Evaluating on {len(texts)} blocks ({sum(labels)} positive).")
+
+    # The accurate model on its own is the baseline the tiers should match
+    runs = {}
+    for name, nlp in [("fast", fast), ("accurate", accurate)]:
+        start = time.perf_counter()
+        docs = pipe_by_length(nlp, texts)
+        runs[name] = {
+            "seconds": time.perf_counter() - start,
+            "decisions": [is_affiliation(doc, threshold) for doc in docs],
+        }
+    for value in band:
+        tiered = TieredTextcat(fast, accurate, threshold, value)
+        start = time.perf_counter()
+        docs = list(tiered.pipe(texts))
+        runs[f"tiered ({value})"] = {
+            "seconds": time.perf_counter() - start,
+            "decisions": [is_affiliation(doc, threshold) for doc in docs],
+            "escalated_share": tiered.stats()["escalated_share"],
+        }
+
+    metrics = {
+        "threshold": threshold,
+        "dev_path": str(dev_path),
+        "blocks": len(texts),
+        "models": {},
+    }
+    table = Table("model", "seconds", "escalated", "agreement", "accuracy", "precision", "recall")
+    baseline = runs["accurate"]["decisions"]
+    for name, run in runs.items():
+        agreement = decision_scores(run["decisions"], baseline)["accuracy"]
+        gold = decision_scores(run["decisions"], labels)
+        metrics["models"][name] = {
+            "seconds": round(run["seconds"], 3),
+            "escalated_share": run.get("escalated_share"),
+            "baseline_agreement": agreement,
+            **gold,
+        }
+        table.add_row(
+            name,
+            f"{run['seconds']:.3f}",
+            str(run.get("escalated_share", "")),
+            str(agreement),
+            str(gold["accuracy"]),
+            str(gold["precision"]),
+            str(gold["recall"]),
+        )
+    print(table)
+    metrics_path.parent.mkdir(parents=True, exist_ok=True)
+    metrics_path.write_text(json.dumps(metrics, indent=2))
+    print(f"Saved metrics to {metrics_path}.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
@@ -0,0 +1,128 @@
+import hashlib
+import inspect
+import json
+import os
+import pathlib
+import tempfile
+from typing import Callable, Sequence
+
+# Stored alongside the extracted text files
+MANIFEST_NAME = ".manifest.json"
+
+
+def file_sha256(path: pathlib.Path) -> str:
+    """Hash the contents of a file."""
+    digest = hashlib.sha256()
+    with path.open("rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fn_version(fn: Callable) -> str:
+    """Version a function by its source code, so edits invalidate old outputs."""
+    return hashlib.sha256(inspect.getsource(fn).encode("utf-8")).hexdigest()[:12]
+
+
+def patterns_version(patterns: Sequence) -> str:
+    """Version compiled regexes by their patterns and flags."""
+    source = "\0".join(f"{pattern.pattern}:{pattern.flags}" for pattern in patterns)
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+def extractor_config(
+    name: str,
+    fns: list[Callable],
+    patterns: Sequence = (),  # Compiled module-level regexes that the functions use
+    **options,
+) -> dict:
+    """Describe everything besides the PDF itself that determines the output."""
+    versions = {fn.__name__: fn_version(fn) for fn in fns}
+    if patterns:
+        versions["patterns"] = patterns_version(patterns)
+    return {
+        "extractor": name,
+        "versions": versions,
+        "options": options,
+    }
+
+
+class ExtractionManifest:
+    """Record of which PDFs were extracted to which outputs, and how."""
+
+    def __init__(self, output_dir: pathlib.Path):
+        self.path = output_dir / MANIFEST_NAME
+        self.output_dir = output_dir
+        try:
+            self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+        self._hashes = {}
+
+    def output_path(self, pdf_path: pathlib.Path) -> pathlib.Path:
+        return self.output_dir / f"{pdf_path.stem}.txt"
+
+    def pdf_hash(self, pdf_path: pathlib.Path) -> str:
+        """Hash a PDF, reusing the stored hash if its size and mtime are unchanged."""
+        if pdf_path in self._hashes:
+            return self._hashes[pdf_path]
+        stat = pdf_path.stat()
+        entry = self.entries.get(pdf_path.stem, {})
+        if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            self._hashes[pdf_path] = entry["sha256"]
+        else:
+            self._hashes[pdf_path] = file_sha256(pdf_path)
+        return self._hashes[pdf_path]
+
+    def is_current(self, pdf_path: pathlib.Path, config: dict) -> bool:
+        """Check if the output for a PDF is up to date with its contents and config."""
+        entry = self.entries.get(pdf_path.stem)
+        if not entry or not self.output_path(pdf_path).is_file():
+            return False
+        return (
+            entry["extractor"] == config["extractor"]
+            and entry["versions"] == config["versions"]
+            and entry["options"] == config["options"]
+            and entry["sha256"] == self.pdf_hash(pdf_path)
+        )
+
+    def record(self, pdf_path: pathlib.Path, config: dict) -> None:
+        """Note that a PDF was successfully extracted with the given config."""
+        stat = pdf_path.stat()
+        self.entries[pdf_path.stem] = {
+            "sha256": self.pdf_hash(pdf_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            **config,
+        }
+
+    def forget(self, pdf_path: pathlib.Path) -> None:
+        """Drop a PDF from the manifest along with any previous output."""
+        self.entries.pop(pdf_path.stem, None)
+        self.output_path(pdf_path).unlink(missing_ok=True)
+
+    def prune(self, pdf_paths: list[pathlib.Path]) -> int:
+        """Remove outputs that don't belong to any of the given PDFs."""
+        stems = {pdf_path.stem for pdf_path in pdf_paths}
+        pruned = 0
+        for txt_path in self.output_dir.glob("*.txt"):
+            if txt_path.stem not in stems:
+                txt_path.unlink()
+                pruned += 1
+        self.entries = {
+            stem: entry for stem, entry in self.entries.items() if stem in stems
+        }
+        return pruned
+
+    def clear(self) -> None:
+        """Remove all outputs and forget everything."""
+        for txt_path in self.output_dir.glob("*.txt"):
+            txt_path.unlink()
+        self.entries = {}
+
+    def save(self) -> None:
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.output_dir, suffix=".tmp", delete=False
+        ) as tmp:
+            json.dump(self.entries, tmp, indent=2, sort_keys=True)
+        os.replace(tmp.name, self.path)
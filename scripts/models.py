@@ -0,0 +1,50 @@
+import os
+
+import spacy
+import spacy_transformers  # noqa: F401
+from core import TieredTextcat, load_pipeline
+from prefilter import BlockPrefilter
+
+ner_model = None
+textcat_model = None
+prefilter_model = None
+
+# Threshold for is_affiliation used by the API and the tiered textcat
+THRESHOLD = 0.75
+
+# Cheap model that rules out blocks before textcat, trained by prefilter.py;
+# only used if it exists and is asked for, since it changes results
+PREFILTER_PATH = os.environ.get("PREFILTER_MODEL", "training/prefilter/model.npz")
+
+# If TEXTCAT_FAST_MODEL is set (e.g. to a tok2vec textcat), it scores every
+# block first and only blocks with a score near its threshold go on to the main
+# textcat model; TEXTCAT_BAND is the share of the way from each threshold to 0
+# or 1 that counts as near
+TEXTCAT_FAST_MODEL = os.environ.get("TEXTCAT_FAST_MODEL")
+TEXTCAT_BAND = float(os.environ.get("TEXTCAT_BAND", 0.25))
+
+
+# memoized helpers for loading models so we don't have to reload them on every request
+def load_ner_model():
+    global ner_model
+    if ner_model is None:
+        ner_model = load_pipeline("en_core_web_trf", "api-minimal")
+    return ner_model
+
+
+def load_textcat_model():
+    global textcat_model
+    if textcat_model is None:
+        textcat_model = spacy.load("training/textcat/model-best")
+        if TEXTCAT_FAST_MODEL:
+            textcat_model = TieredTextcat(
+                spacy.load(TEXTCAT_FAST_MODEL), textcat_model, THRESHOLD, TEXTCAT_BAND
+            )
+    return textcat_model
+
+
+def load_prefilter_model():
+    global prefilter_model
+    if prefilter_model is None and os.path.isfile(PREFILTER_PATH):
+        prefilter_model = BlockPrefilter.from_disk(PREFILTER_PATH)
+    return prefilter_model
@@ -4,7 +4,7 @@ import pathlib
 import xml.etree.ElementTree as ET
 
 import requests
-from utils import get_cocina_affiliations
+from core import get_cocina_affiliations
 
 root = os.path.abspath(os.path.join(os.getcwd(), os.pardir))
 PROJECT_ROOT = pathlib.Path(root)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import pathlib
+import re
+import time
+import zlib
+
+import numpy as np
+import spacy
+import typer
+from rich import print
+from rich.table import Table
+from spacy.tokens import DocBin
+from thefuzz import fuzz
+
+# Number of hashed features; collisions barely matter at this corpus size
+N_FEATURES = 2**18
+
+# Cheap signals for affiliation and author blocks, added as extra features
+KEYWORD_PATTERNS = {
+    "org": re.compile(
+        r"universi|department|dept\.|institut|school|college|laborator|centre|center"
+        r"|hospital|faculty|academy|foundation|division|program",
+        re.IGNORECASE,
+    ),
+    "email": re.compile(r"\S+@\S+\.\w+"),
+    "marker": re.compile(r"[*†‡§¶]|^\s*\d{1,2}\s|^\s*[a-z]\s"),
+    "address": re.compile(r"\b[A-Z]{2}\s+\d{5}\b|\b\d{5}\b|\bUSA\b|\bUK\b"),
+    "citation": re.compile(r"et al\.|\(\d{4}\)|\bdoi\b|\bvol\.|pp\.", re.IGNORECASE),
+}
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def hash_feature(feature: str) -> int:
+    # crc32 rather than hash() so that features are stable across processes
+    return zlib.crc32(feature.encode("utf-8")) % N_FEATURES
+
+
+def block_features(text: str) -> list[int]:
+    """Get the hashed features of a block: word n-grams, keywords and length."""
+    words = WORD_PATTERN.findall(text.lower())
+    features = [f"w:{word}" for word in words]
+    features += [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    features += [f"k:{name}" for name, pattern in KEYWORD_PATTERNS.items() if pattern.search(text)]
+    features.append(f"len:{min(len(words) // 10, 10)}")
+    return [hash_feature(feature) for feature in set(features)]
+
+
+class BlockPrefilter:
+    """Hashed n-gram logistic regression that rules out blocks before textcat."""
+
+    def __init__(self, weights: np.ndarray, bias: float, threshold: float):
+        self.weights = weights
+        self.bias = bias
+        self.threshold = threshold
+
+    def score(self, texts: list[str]) -> np.ndarray:
+        """Get the probability that each block is an affiliation or author block."""
+        logits = np.array(
+            [self.weights[block_features(text)].sum() + self.bias for text in texts]
+        )
+        return 1 / (1 + np.exp(-logits))
+
+    @property
+    def model_id(self) -> str:
+        """Identify the model by its parameters, e.g. for caching its results."""
+        digest = hashlib.sha256(self.weights.tobytes())
+        digest.update(f"{self.bias}:{self.threshold}".encode("utf-8"))
+        return f"prefilter-{digest.hexdigest()[:12]}"
+
+    def keep(self, texts: list[str]) -> list[bool]:
+        """Check which blocks should go on to textcat."""
+        return (self.score(texts) >= self.threshold).tolist()
+
+    @classmethod
+    def train(
+        cls,
+        texts: list[str],
+        labels: list[bool],
+        epochs: int = 10,
+        learn_rate: float = 0.1,
+        l2: float = 1e-6,
+        seed: int = 0,
+    ) -> "BlockPrefilter":
+        """Fit the model with SGD, weighting classes so positives aren't swamped."""
+        rng = np.random.default_rng(seed)
+        features = [np.array(block_features(text)) for text in texts]
+        y = np.array(labels, dtype=float)
+        pos_weight = (len(y) - y.sum()) / max(y.sum(), 1)
+        weights = np.zeros(N_FEATURES)
+        bias = 0.0
+        for _ in range(epochs):
+            for i in rng.permutation(len(texts)):
+                prob = 1 / (1 + np.exp(-(weights[features[i]].sum() + bias)))
+                grad = (prob - y[i]) * (pos_weight if y[i] else 1.0)
+                weights[features[i]] -= learn_rate * (grad + l2 * weights[features[i]])
+                bias -= learn_rate * grad
+        return cls(weights, bias, threshold=0.5)
+
+    def calibrate(self, texts: list[str], labels: list[bool], recall: float) -> float:
+        """Set the highest threshold that still keeps the given share of positives."""
+        scores = np.sort(self.score([t for t, label in zip(texts, labels) if label]))
+        if len(scores):
+            # Keep at least ceil(recall * n) positives, i.e. drop the rest, but
+            # the threshold has to be one of the scores
+            max_dropped = min(int(len(scores) * (1 - recall) + 1e-9), len(scores) - 1)
+            self.threshold = float(scores[max_dropped])
+        return self.threshold
+
+    def to_disk(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as file:
+            np.savez_compressed(
+                file, weights=self.weights, bias=self.bias, threshold=self.threshold
+            )
+
+    @classmethod
+    def from_disk(cls, path: pathlib.Path) -> "BlockPrefilter":
+        data = np.load(path)
+        return cls(data["weights"], float(data["bias"]), float(data["threshold"]))
+
+
+def read_corpus(paths: list[pathlib.Path]) -> tuple[list[str], list[bool]]:
+    """Read blocks from spaCy corpora, labelled by whether they're affiliation-like."""
+    # Both the binary and multilabel textcat corpora are used; a block counts
+    # as positive if any of its labels would make it an affiliation
+    vocab = spacy.blank("en").vocab
+    examples = {}
+    for path in paths:
+        for doc in DocBin().from_disk(path).get_docs(vocab):
+            positive = doc.cats.get("AFFILIATION", 0) >= 0.5 or doc.cats.get("AUTHOR", 0) >= 0.5
+            examples[doc.text] = examples.get(doc.text, False) or positive
+    return list(examples.keys()), list(examples.values())
+
+
+def recall_at(prefilter: BlockPrefilter, texts: list[str], labels: list[bool]) -> dict:
+    """Measure how many positives a prefilter keeps and how many blocks it skips."""
+    kept = prefilter.keep(texts)
+    positives = sum(labels)
+    return {
+        "recall": round(sum(k for k, label in zip(kept, labels) if label) / max(positives, 1), 4),
+        "skipped": round(1 - sum(kept) / max(len(kept), 1), 4),
+    }
+
+
+def main(
+    corpus_path: pathlib.Path = pathlib.Path("corpus"),
+    output_path: pathlib.Path = pathlib.Path("training/prefilter/model.npz"),
+    preprints_path: pathlib.Path = pathlib.Path("assets/preprints/txt"),
+    curated_path: pathlib.Path = pathlib.Path("datasets/curated"),
+    metrics_path: pathlib.Path = pathlib.Path("metrics/prefilter.json"),
+    recall: float = 0.99,  # Share of affiliation and author blocks to let through
+    epochs: int = 10,
+    textcat_model: str | None = None,  # Also time textcat and check its decisions
+    threshold: float = 0.5,  # Threshold for textcat decisions
+) -> None:
+    """Train a cheap pre-filter for blocks and report how much inference it saves."""
+    # Train on the training sets and calibrate the threshold on the dev sets
+    train_texts, train_labels = read_corpus(sorted(corpus_path.glob("textcat*/train.spacy")))
+    dev_texts, dev_labels = read_corpus(sorted(corpus_path.glob("textcat*/dev.spacy")))
+    print(f"Training on {len(train_texts)} blocks ({sum(train_labels)} positive).")
+    prefilter = BlockPrefilter.train(train_texts, train_labels, epochs=epochs)
+    prefilter.calibrate(dev_texts, dev_labels, recall)
+    prefilter.to_disk(output_path)
+    metrics = {
+        "recall_target": recall,
+        "threshold": round(prefilter.threshold, 4),
+        "dev": recall_at(prefilter, dev_texts, dev_labels),
+    }
+    print(f"Saved pre-filter to {output_path} with threshold {prefilter.threshold:.4f}.")
+
+    # On the curated preprints, blocks that closely match the curated
+    # affiliation text stand in for gold labels
+    textcat = spacy.load(textcat_model) if textcat_model else None
+    table = Table("preprint", "blocks", "skipped", "chars skipped", "curated kept")
+    totals = {"blocks": 0, "skipped": 0, "chars": 0, "chars_skipped": 0}
+    curated_found = curated_kept = 0
+    textcat_positive = textcat_lost = 0
+    textcat_seconds = filtered_seconds = 0.0
+    for path in sorted(curated_path.glob("*.txt")):
+        preprint_path = preprints_path / path.name
+        if not preprint_path.is_file():
+            continue
+        curated = path.read_text(encoding="utf-8").lower()
+        blocks = [block for block in preprint_path.read_text(encoding="utf-8").splitlines() if block.strip()]
+        kept = prefilter.keep(blocks)
+        gold = [len(block) >= 20 and fuzz.partial_ratio(block.lower(), curated) >= 90 for block in blocks]
+        skipped_chars = sum(len(block) for block, k in zip(blocks, kept) if not k)
+        totals["blocks"] += len(blocks)
+        totals["skipped"] += kept.count(False)
+        totals["chars"] += sum(len(block) for block in blocks)
+        totals["chars_skipped"] += skipped_chars
+        curated_found += sum(gold)
+        curated_kept += sum(g and k for g, k in zip(gold, kept))
+        table.add_row(
+            path.stem,
+            str(len(blocks)),
+            str(kept.count(False)),
+            str(skipped_chars),
+            f"{sum(g and k for g, k in zip(gold, kept))}/{sum(gold)}",
+        )
+
+        # Compare textcat on every block with textcat on only the kept blocks
+        if textcat:
+            start = time.perf_counter()
+            docs = list(textcat.pipe(blocks))
+            textcat_seconds += time.perf_counter() - start
+            start = time.perf_counter()
+            prefilter.keep(blocks)
+            list(textcat.pipe(block for block, k in zip(blocks, kept) if k))
+            filtered_seconds += time.perf_counter() - start
+            for doc, k in zip(docs, kept):
+                if doc.cats.get("AFFILIATION", 0) > threshold or doc.cats.get("AUTHOR", 0) > threshold:
+                    textcat_positive += 1
+                    textcat_lost += not k
+
+    metrics["curated"] = {
+        "blocks": totals["blocks"],
+        "blocks_skipped": round(totals["skipped"] / max(totals["blocks"], 1), 4),
+        "chars_skipped": round(totals["chars_skipped"] / max(totals["chars"], 1), 4),
+        "curated_recall": round(curated_kept / max(curated_found, 1), 4),
+    }
+    if textcat:
+        metrics["curated"].update(
+            {
+                "textcat_seconds": round(textcat_seconds, 3),
+                "filtered_seconds": round(filtered_seconds, 3),
+                "textcat_positives_lost": f"{textcat_lost}/{textcat_positive}",
+            }
+        )
+    print(table)
+    print(metrics)
+    metrics_path.parent.mkdir(parents=True, exist_ok=True)
+    metrics_path.write_text(json.dumps(metrics, indent=2))
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
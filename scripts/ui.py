@@ -0,0 +1,27 @@
+import random
+
+import spacy
+import streamlit as st
+from core import load_pipeline, preprint_corpus, read_preprint_metadata
+
+
+@st.cache_resource
+def load_model(name: str, profile: str | None = None) -> spacy.language.Language:
+    """Load a spaCy model."""
+    return load_pipeline(name, profile)
+
+
+@st.cache_data
+def get_preprint_metadata(openalex_id):
+    """Get the metadata of a preprint by its OpenAlex ID."""
+    return read_preprint_metadata(openalex_id)
+
+
+def random_preprint():
+    """Select a preprint at random and store in streamlit session state."""
+    st.session_state.selected_preprint = random.choice(preprint_corpus.ids)
+
+
+def choose_preprint(openalex_id):
+    """Store the selected preprint in streamlit session state."""
+    st.session_state.selected_preprint = openalex_id
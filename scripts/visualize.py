@@ -1,18 +1,22 @@
 import spacy
 import spacy_transformers  # required to load transformer models
 import streamlit as st
-from utils import (
+from core import (
                    all_openalex_ids,
                    analyze_blocks,
-                   choose_preprint,
+                   analyze_blocks_artifact,
                    get_affiliation_dict,
                    get_affiliation_graph,
                    get_cocina_affiliations,
-                   get_preprint_metadata,
+                   get_preprint_blocks_path,
                    get_preprint_text,
+                   set_affiliation_ents,
+)
+from ui import (
+                   choose_preprint,
+                   get_preprint_metadata,
                    load_model,
                    random_preprint,
-                   set_affiliation_ents,
 )
 
 st.set_page_config(
@@ -104,9 +108,8 @@ st.sidebar.selectbox(
     key="ner_model",
 )
 model_load_state = st.info(f"Loading model '{st.session_state.ner_model}'...")
-_ner = load_model(st.session_state.ner_model)
+_ner = load_model(st.session_state.ner_model, "visualize-full")
 _textcat = spacy.load("training/textcat_multilabel/model-best")
-_ner.disable_pipes("parser")
 model_load_state.empty()
 st.sidebar.subheader("Pipeline info")
 desc = f"""<p style="font-size: 0.85em; line-height: 1.5"><strong>{st.session_state.ner_model}:</strong> <code>v{_ner.meta['version']}</code>. {_ner.meta.get("description", "")}</p>"""
@@ -124,14 +127,21 @@ st.markdown(
 st.session_state.pdf_path = (
     f"assets/preprints/pdf/{st.session_state.selected_preprint}.pdf"
 )
+st.session_state.blocks_path = get_preprint_blocks_path(st.session_state.selected_preprint)
 st.session_state.pdf_text = get_preprint_text(st.session_state.selected_preprint)
 st.session_state.pdf_meta = get_preprint_metadata(st.session_state.selected_preprint)
 st.session_state.cocina_affiliations = get_cocina_affiliations(st.session_state.pdf_meta)
 
 # Do the analysis
-st.session_state.analyzed_blocks = analyze_blocks(
-    st.session_state.pdf_text, _textcat, st.session_state.threshold, _ner
-)
+# Use the stored blocks and their layout if the PDF was extracted with them
+if st.session_state.blocks_path:
+    st.session_state.analyzed_blocks = analyze_blocks_artifact(
+        st.session_state.blocks_path, _textcat, st.session_state.threshold, _ner
+    )
+else:
+    st.session_state.analyzed_blocks = analyze_blocks(
+        st.session_state.pdf_text, _textcat, st.session_state.threshold, _ner
+    )
 st.session_state.flat_blocks = [block for page in st.session_state.analyzed_blocks for block in page]
 st.session_state.affiliation_blocks = [block for block in st.session_state.flat_blocks if block["is_affiliation"]]
 st.session_state.affiliations = " ".join([block["text"] for block in st.session_state.affiliation_blocks])
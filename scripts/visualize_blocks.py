@@ -1,6 +1,6 @@
 import streamlit as st
-
-from scripts.clean_preprints_pymupdf import (
+from block_artifacts import blocks_to_struct, read_blocks
+from clean_preprints_pymupdf import (
     clean_pdf_struct,
     collapse_lines,
     collapse_spans,
@@ -12,7 +12,8 @@ from scripts.clean_preprints_pymupdf import (
 )
 
 
-# Add "page 1", "block 1", etc. labels to the PDF structure for display
+# Add "page 1", "block 1", etc. labels to the PDF structure for display;
+# works with both the nested lists and a FlatPdfStruct
 def annotate_pdf_struct(pdf_struct):
     annotated_struct = {}
     for page_num, page in enumerate(pdf_struct):
@@ -32,8 +33,11 @@ def annotate_pdf_struct(pdf_struct):
 # Main content area
 col1, col2 = st.columns([1, 1])
 
-# Convert PDF to structured data
-pdf_struct = pdf_path_to_struct(st.session_state.pdf_path)
+# Convert PDF to structured data, or load it if it was saved during extraction
+if st.session_state.get("blocks_path"):
+    pdf_struct = blocks_to_struct(read_blocks(st.session_state.blocks_path))
+else:
+    pdf_struct = pdf_path_to_struct(st.session_state.pdf_path, flat=True)
 annotated_pdf_struct = annotate_pdf_struct(pdf_struct)
 first_page_struct = {"page 0": annotated_pdf_struct["page 0"]}
 
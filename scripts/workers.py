@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+import itertools
+import json
+import multiprocessing
+import os
+import pathlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+import typer
+from rich import print
+from rich.progress import track
+
+# Environment variables that cap the threads used by BLAS/OpenMP and torch;
+# these have to be set before those libraries are first imported
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+# Rough memory each worker needs once it has loaded en_core_web_trf and the
+# textcat model, with room for their activations. This is an estimate, so pass
+# --workers to override the default it gives
+WORKER_MEMORY = 3 * 1024**3
+
+# Set in each worker process by init_worker
+worker_options = {}
+
+
+def init_worker(threads: int, options: dict) -> None:
+    """Limit a worker's threads and load its models once, before any work arrives."""
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    # Import here rather than at the top, so that the thread limits apply
+    from models import load_ner_model, load_prefilter_model, load_textcat_model
+
+    load_textcat_model()
+    load_ner_model()
+    if options.get("prefilter"):
+        load_prefilter_model()
+
+    # Each worker keeps its own in-memory prediction cache, and workers share
+    # its on-disk tier if there is one
+    from caching import BlockPredictionCache
+    from core import set_prediction_cache
+
+    cache_path = options.get("cache_path")
+    set_prediction_cache(
+        BlockPredictionCache(path=pathlib.Path(cache_path) if cache_path else None)
+    )
+    if options.get("batch_tokens") is not None:
+        from core import set_batch_tokens
+
+        set_batch_tokens(options["batch_tokens"])
+    worker_options.update(options)
+
+
+def analyze_chunk(chunk: list[str | pathlib.Path]) -> list[dict]:
+    """Analyze a chunk of documents in a worker, batching their blocks together."""
+    from core import analyze_many, analyze_pdf_text, get_affiliation_dict, read_document
+    from models import load_ner_model, load_prefilter_model, load_textcat_model
+
+    textcat = load_textcat_model()
+    ner = load_ner_model()
+    prefilter = load_prefilter_model() if worker_options.get("prefilter") else None
+    threshold = worker_options.get("threshold", 0.75)
+    maybe_threshold = worker_options.get("maybe_threshold")
+    max_pages = worker_options.get("max_pages")
+    try:
+        graphs = analyze_many(
+            chunk,
+            textcat,
+            ner,
+            threshold,
+            maybe_threshold,
+            prefilter=prefilter,
+            max_pages=max_pages,
+        )
+        # Graphs hold spaCy spans, so only send the plain dicts back
+        return [
+            {"affiliations": get_affiliation_dict(graph), "error": None} for graph in graphs
+        ]
+    except Exception:
+        pass
+
+    # If any document failed, redo the chunk one document at a time so that
+    # only the failing documents are reported as errors
+    results = []
+    for text_or_path in chunk:
+        try:
+            text = read_document(text_or_path, max_pages)
+            graph = analyze_pdf_text(text, textcat, ner, threshold, maybe_threshold, prefilter)
+            results.append({"affiliations": get_affiliation_dict(graph), "error": None})
+        except Exception as e:
+            results.append({"affiliations": {}, "error": str(e) or repr(e)})
+    return results
+
+
+def analyze_documents(
+    texts_or_paths: Iterable[str | pathlib.Path],  # Texts, or paths to .txt or .pdf files
+    workers: int = 1,  # Number of worker processes
+    threads: int = 1,  # Threads each worker may use for BLAS and torch
+    chunk_size: int = 8,  # Documents sent to a worker at a time
+    **options,  # Any of the options to main, e.g. threshold or prefilter
+) -> Iterator[dict]:
+    """Analyze documents in a pool of worker processes, yielding results in order."""
+    chunks = (list(chunk) for chunk in itertools.batched(texts_or_paths, chunk_size))
+
+    # Workers are spawned rather than forked so that they start without any
+    # threads or models from this process; if loading the models fails, the
+    # pool breaks and raises rather than starting new workers forever
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(threads, options),
+    ) as executor:
+        for results in executor.map(analyze_chunk, chunks):
+            yield from results
+
+
+def default_workers(threads: int = 1) -> int:
+    """Get how many workers fit in the CPUs and the memory available now."""
+    from core import available_memory
+
+    by_cpu = max((os.cpu_count() or 1) // threads, 1)
+    available = available_memory()
+    # Without a reading of the memory available, stay conservative
+    if available is None:
+        return min(by_cpu, 4)
+    return max(min(by_cpu, available // WORKER_MEMORY), 1)
+
+
+def main(
+    input_dir: pathlib.Path,  # Directory of .txt or .pdf files
+    output_file: pathlib.Path,  # JSONL file with the affiliations of each document
+    workers: int | None = None,  # Number of worker processes; by default as many as fit in memory
+    threads: int = 1,  # Threads each worker may use for BLAS and torch
+    chunk_size: int = 8,  # Documents sent to a worker at a time
+    threshold: float = 0.75,
+    maybe_threshold: float | None = None,  # Only run NER on blocks scoring this much
+    max_pages: int | None = None,  # Only extract this many pages from PDFs
+    prefilter: bool = False,  # Use the pre-filter model before textcat
+    cache_path: pathlib.Path | None = None,  # SQLite file to share predictions in
+    batch_tokens: str = "auto",  # Tokens per batch of blocks, "auto", or 0 for fixed-size batches
+) -> None:
+    """Extract affiliations from a directory of documents using many processes."""
+    from core import parse_batch_tokens
+
+    try:
+        batch_tokens = parse_batch_tokens(batch_tokens)
+    except ValueError as error:
+        raise typer.BadParameter(str(error), param_hint="--batch-tokens")
+    if workers is None:
+        workers = default_workers(threads)
+        print(f"Using {workers} workers.")
+    paths = sorted(
+        path for path in input_dir.iterdir() if path.suffix.lower() in (".txt", ".pdf")
+    )
+    results = analyze_documents(
+        paths,
+        workers=workers,
+        threads=threads,
+        chunk_size=chunk_size,
+        threshold=threshold,
+        maybe_threshold=maybe_threshold,
+        max_pages=max_pages,
+        prefilter=prefilter,
+        cache_path=str(cache_path) if cache_path else None,
+        batch_tokens=batch_tokens,
+    )
+    errors = 0
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with output_file.open("w", encoding="utf-8") as file:
+        for path, result in track(
+            zip(paths, results), description="Analyzing documents...", total=len(paths)
+        ):
+            if result["error"]:
+                print(f"Error analyzing {path}: {result['error']}")
+                errors += 1
+            file.write(json.dumps({"id": path.stem, **result}) + "\n")
+    print(f"Analyzed {len(paths) - errors} of {len(paths)} documents.")
+
+
+if __name__ == "__main__":
+    typer.run(main)
+
+__doc__ = main.__doc__
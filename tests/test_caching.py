@@ -0,0 +1,68 @@
+import threading
+
+import spacy
+from caching import memoize, model_id
+
+
+def test_memoize_is_thread_safe():
+    # With one entry, concurrent callers keep evicting each other's results
+    @memoize(lambda n: (n,), max_entries=1)
+    def square(n: int) -> list[int]:
+        return [n * n]
+
+    errors = []
+    start = threading.Barrier(8)
+
+    def call(offset: int) -> None:
+        start.wait()
+        try:
+            for i in range(2000):
+                n = (i + offset) % 5
+                assert square(n) == [n * n]
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=call, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    info = square.cache_info()
+    assert info["entries"] == 1
+    assert info["hits"] + info["misses"] == 8 * 2000
+
+
+def test_model_id_covers_weights():
+    def make_pipeline() -> spacy.language.Language:
+        nlp = spacy.blank("en")
+        nlp.add_pipe("textcat_multilabel").add_label("AFFILIATION")
+        nlp.initialize()
+        return nlp
+
+    # Same config, but each pipeline is initialized with its own random weights
+    first, second = make_pipeline(), make_pipeline()
+    assert model_id(first) != model_id(second)
+    # and loading the same weights again gets the same ID
+    assert model_id(make_pipeline().from_bytes(first.to_bytes())) == model_id(first)
+
+
+def test_cached_cats_and_ents_from_one_pipeline():
+    import core
+    from caching import BlockPredictionCache
+
+    nlp = spacy.blank("en")
+    nlp.add_pipe("textcat_multilabel").add_label("AFFILIATION")
+    nlp.add_pipe("ner").add_label("ORG")
+    nlp.initialize()
+    texts = ["Stanford University", "Jane Doe"]
+    core.set_prediction_cache(BlockPredictionCache())
+    try:
+        # The second pass reads both tasks' predictions from the cache
+        for _ in range(2):
+            docs = list(core.run_textcat(nlp, texts))
+            core.set_ner_ents(nlp, docs)
+            assert all("AFFILIATION" in doc.cats for doc in docs)
+    finally:
+        core.set_prediction_cache(None)
@@ -0,0 +1,23 @@
+import pathlib
+import time
+
+from clean_preprints_pymupdf import extract_pdfs
+
+
+def extract(path: pathlib.Path) -> dict:
+    # Stands in for a PDF that never comes back from MuPDF
+    if path.stem == "hang":
+        time.sleep(600)
+    return {"path": path, "output": path.with_suffix(".txt"), "error": None}
+
+
+def test_timeout_replaces_stuck_workers():
+    paths = [pathlib.Path(f"{name}.pdf") for name in ["a", "hang", "b", "c", "hang", "d"]]
+    start = time.monotonic()
+    results = list(extract_pdfs(extract, paths, workers=2, timeout=1))
+
+    assert time.monotonic() - start < 30
+    assert len(results) == len(paths)
+    errors = sorted(str(r["path"]) for r in results if r["error"])
+    assert errors == ["hang.pdf", "hang.pdf"]
+    assert all("timed out" in r["error"] for r in results if r["error"])
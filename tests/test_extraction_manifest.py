@@ -0,0 +1,41 @@
+import re
+
+import regex
+from extraction_manifest import ExtractionManifest, extractor_config
+
+
+def normalize(text: str) -> str:
+    return text
+
+
+def make_config(patterns: list) -> dict:
+    return extractor_config("test", [normalize], patterns=patterns, max_pages=None)
+
+
+def test_changed_pattern_invalidates_output(tmp_path):
+    pdf_path = tmp_path / "W1.pdf"
+    pdf_path.write_bytes(b"%PDF-1.4")
+    output_dir = tmp_path / "txt"
+    output_dir.mkdir()
+    manifest = ExtractionManifest(output_dir)
+    manifest.output_path(pdf_path).write_text("text", encoding="utf-8")
+
+    config = make_config([re.compile(r"^\d+\W*$"), regex.compile(r" (\p{Mn})(\w)")])
+    manifest.record(pdf_path, config)
+    assert manifest.is_current(pdf_path, config)
+
+    # Same patterns compiled again count as the same config
+    same = make_config([re.compile(r"^\d+\W*$"), regex.compile(r" (\p{Mn})(\w)")])
+    assert manifest.is_current(pdf_path, same)
+
+    changed = make_config([re.compile(r"^\d+\W+$"), regex.compile(r" (\p{Mn})(\w)")])
+    assert not manifest.is_current(pdf_path, changed)
+    flags = make_config([re.compile(r"^\d+\W*$", re.I), regex.compile(r" (\p{Mn})(\w)")])
+    assert not manifest.is_current(pdf_path, flags)
+
+
+def test_pymupdf_config_covers_patterns():
+    import clean_preprints_pymupdf
+
+    assert clean_preprints_pymupdf.DIACRITIC_PATTERN in clean_preprints_pymupdf.NORM_PATTERNS
+    assert clean_preprints_pymupdf.NUMBERED_LINE_PATTERN in clean_preprints_pymupdf.NORM_PATTERNS
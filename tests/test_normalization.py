@@ -0,0 +1,67 @@
+import random
+
+import pytest
+from benchmark_normalization import chained_text_from_struct
+from clean_preprints_pymupdf import FlatPdfStruct, text_from_struct
+
+PAGES = [
+    [
+        # Line numbers, alone in their line or not
+        [["12"], ["Jane Doe", "1,2", "*"], ["3 "], ["Stanford University"]],
+        [["  "], ["\t"], [" ", " "]],
+        # Punctuation and markers at the ends of lines
+        [["Department of Biology,"], ["Stanford;"], ["USA†"], ["*corresponding author"]],
+        [["a,b;c*d†e‡f§g¶h"], [",", ";"], ["†"]],
+    ],
+    [
+        # Spacing diacritics, as PyMuPDF returns them
+        [["Universit", "e ´ de Montr", "e ´ al"], ["M", "u ¨ nchen"], ["´"]],
+        [["1."], ["42"], ["7)"], ["Introduction"]],
+        [],
+        [[]],
+    ],
+    [],
+]
+
+ALPHABET = ["1", "23", " ", "  ", "\t", ",", ";", "*", "†", "‡", "´", "¨", "˜", "a", "é", "-", "."]
+
+
+def random_pages(rng: random.Random) -> list:
+    return [
+        [
+            [
+                [
+                    "".join(rng.choices(ALPHABET, k=rng.randint(0, 4)))
+                    for _ in range(rng.randint(0, 3))
+                ]
+                for _ in range(rng.randint(0, 4))
+            ]
+            for _ in range(rng.randint(0, 4))
+        ]
+        for _ in range(rng.randint(0, 3))
+    ]
+
+
+def to_flat(pages: list) -> FlatPdfStruct:
+    flat = FlatPdfStruct()
+    for page in pages:
+        flat.append(page)
+    flat.finish()
+    return flat
+
+
+@pytest.mark.parametrize("flat", [False, True])
+def test_fused_normalization_matches_chain(flat):
+    expected = chained_text_from_struct(PAGES)
+    assert text_from_struct(to_flat(PAGES) if flat else PAGES) == expected
+    # Make sure the cases above actually do something
+    assert "42" not in expected and "Biology, Stanford" in expected
+
+
+@pytest.mark.parametrize("flat", [False, True])
+def test_fused_normalization_matches_chain_on_random_structs(flat):
+    rng = random.Random(0)
+    for _ in range(500):
+        pages = random_pages(rng)
+        expected = chained_text_from_struct(pages)
+        assert text_from_struct(to_flat(pages) if flat else pages) == expected
@@ -0,0 +1,23 @@
+import pytest
+import spacy
+from core import PIPELINE_PROFILES, REQUIRED_ATTRS, check_pipeline, load_pipeline
+
+
+def test_every_profile_has_required_attrs():
+    assert set(PIPELINE_PROFILES) == set(REQUIRED_ATTRS)
+
+
+def test_check_pipeline_reports_missing_attrs():
+    with pytest.raises(ValueError, match="ENT_IOB, POS"):
+        check_pipeline(spacy.blank("en"), ["ENT_IOB", "POS"])
+
+
+@pytest.mark.skipif(
+    not spacy.util.is_package("en_core_web_trf"), reason="en_core_web_trf isn't installed"
+)
+@pytest.mark.parametrize("profile", PIPELINE_PROFILES)
+def test_profile_sets_required_attrs(profile):
+    nlp = load_pipeline("en_core_web_trf", profile)
+    doc = nlp("Jane Doe 1, John Smith 2\n1 Department of Biology, Stanford University")
+    for attr in REQUIRED_ATTRS[profile]:
+        assert doc.has_annotation(attr), f"{profile} doesn't set {attr}"
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+from prefilter import N_FEATURES, BlockPrefilter
+
+
+@pytest.mark.parametrize("recall", [0.0, 0.5, 1.0])
+def test_calibrate_keeps_recall(recall):
+    texts = ["Stanford University", "Department of Biology", "Jane Doe", "Results", "Methods"]
+    labels = [True, True, True, False, False]
+    rng = np.random.default_rng(0)
+    prefilter = BlockPrefilter(rng.normal(size=N_FEATURES), 0.0, threshold=0.5)
+    threshold = prefilter.calibrate(texts, labels, recall)
+
+    kept = prefilter.keep(texts)
+    assert threshold == prefilter.threshold
+    assert sum(k for k, label in zip(kept, labels) if label) >= max(recall * 3, 1)
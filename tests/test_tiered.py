@@ -0,0 +1,20 @@
+import pytest
+import spacy
+from core import TieredTextcat
+
+
+@pytest.mark.parametrize(
+    "cats,uncertain",
+    [
+        # Confident negatives, including a low CITATION score, stay with the fast model
+        ({"AFFILIATION": 0.02, "AUTHOR": 0.01, "CITATION": 0.05}, False),
+        ({"AFFILIATION": 0.95, "AUTHOR": 0.01, "CITATION": 0.01}, False),
+        ({"AFFILIATION": 0.7, "AUTHOR": 0.01, "CITATION": 0.01}, True),
+        ({"AFFILIATION": 0.95, "AUTHOR": 0.01, "CITATION": 0.3}, True),
+    ],
+)
+def test_is_uncertain_uses_each_labels_threshold(cats, uncertain):
+    tiered = TieredTextcat(None, None, threshold=0.75, band=0.25)
+    doc = spacy.blank("en")("Stanford University")
+    doc.cats = cats
+    assert tiered.is_uncertain(doc) == uncertain